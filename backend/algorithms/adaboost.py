@@ -1,64 +1,242 @@
 import numpy as np
-from .decision_tree import DecisionTree  # 使用决策树作为弱分类器
+
+
+class DecisionStump:
+    """单层决策树（决策桩）：特征值 < 阈值的样本走左叶，否则走右叶"""
+    def __init__(self, feature, threshold, value, classes):
+        self.feature_ = feature        # 分割特征索引
+        self.threshold_ = threshold    # 分割阈值
+        self.value_ = value            # 左右叶的加权类别分布，形状 (2, n_classes)
+        self.classes_ = classes        # 类别编号对应的原始标签
+
+    def apply(self, X):
+        """返回样本落入的叶编号：0 为左叶，1 为右叶"""
+        return (X[:, self.feature_] >= self.threshold_).astype(np.int64)
+
+    def predict_codes(self, X):
+        """返回类别编号"""
+        return np.argmax(self.value_, axis=1)[self.apply(X)]
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        return self.classes_[self.predict_codes(X)]
+
+
+class _StumpLearner:
+    """带样本权重的决策桩学习器
+
+    每个特征在整个 boosting 过程中只排序一次；之后每一轮只需按排好的顺序累加
+    各类别的样本权重，就能以 O(n·d) 得到所有候选阈值的加权错误率。
+    """
+    # 每次累加的 (样本, 特征, 类别) 元素个数上限，控制临时数组内存
+    BLOCK_ELEMENTS = 1 << 22
+
+    def __init__(self, X, y):
+        self.classes_, self._codes = np.unique(y, return_inverse=True)
+        n_samples, n_features = X.shape
+        self._one_hot = np.eye(len(self.classes_))[self._codes]
+        self._order = np.argsort(X, axis=0, kind='stable')
+        sorted_X = np.take_along_axis(X, self._order, axis=0)
+        # 第 i 个候选把排序后的前 i+1 个样本分到左叶，阈值取右叶的最小值；相邻值相同时不能分割
+        self._thresholds = sorted_X[1:]
+        self._valid = sorted_X[1:] > sorted_X[:-1]
+        self._block = max(1, self.BLOCK_ELEMENTS // max(1, n_samples * len(self.classes_)))
+
+    def fit(self, sample_weights):
+        """按当前样本权重返回加权错误率最小的决策桩"""
+        weighted = self._one_hot * sample_weights[:, None]
+        total = weighted.sum(axis=0)
+        n_features = self._order.shape[1]
+
+        # 无法分割时退化为把所有样本分到左叶的常数分类器
+        best = (-np.inf, 0, np.inf, total)
+        if len(self._thresholds) == 0:
+            n_features = 0
+        for start in range(0, n_features, self._block):
+            stop = min(start + self._block, n_features)
+            left = np.cumsum(weighted[self._order[:, start:stop]], axis=0)[:-1]
+            # 每个叶节点预测其权重最大的类别，被正确分类的权重之和越大越好
+            score = left.max(axis=-1) + (total - left).max(axis=-1)
+            score = np.where(self._valid[:, start:stop], score, -np.inf)
+            position, offset = np.unravel_index(int(np.argmax(score)), score.shape)
+            if score[position, offset] > best[0]:
+                feature = start + offset
+                best = (score[position, offset], feature, self._thresholds[position, feature], left[position, offset])
+
+        _, feature, threshold, left_weights = best
+        value = np.vstack((left_weights, total - left_weights))
+        return DecisionStump(int(feature), float(threshold), value, self.classes_)
+
 
 class AdaBoost:
-    """AdaBoost算法实现（分类）"""
-    def __init__(self, n_estimators=50):
+    """AdaBoost算法实现（分类）
+
+    多分类使用 SAMME（离散输出）或 SAMME.R（概率输出）。每个决策桩的贡献
+    都表示为一张 (2, n_classes) 的得分表，集成模型的得分就是各桩按叶编号查表后累加。
+    """
+    def __init__(self, n_estimators=50, algorithm='SAMME'):
+        """
+        :param n_estimators: 弱分类器数量
+        :param algorithm: 'SAMME' 或 'SAMME.R'
+        """
+        if algorithm not in ('SAMME', 'SAMME.R'):
+            raise ValueError(f"不支持的算法: {algorithm}")
         self.n_estimators = n_estimators
+        self.algorithm = algorithm
         self.estimators = []  # 存储弱分类器
         self.estimator_weights = []  # 存储弱分类器权重
-        
-    def train(self, X, y):
+        self.classes_ = None
+        self.n_classes_ = 0
+        self.score_tables_ = None     # 每个弱分类器的得分表，形状 (n_estimators, 2, n_classes)
+        self.training_errors_ = []    # 每一轮之后集成模型在训练集上的错误率
+        self.validation_errors_ = []  # 每一轮之后集成模型在验证集上的错误率（提供验证集时）
+        self.stopped_round_ = 0       # 实际训练的轮数
+        self.stop_reason_ = None      # 停止原因：max_estimators / zero_error / weak_learner_too_weak / validation_plateau
+
+    @staticmethod
+    def _leaf_log_proba(stump):
+        """左右叶内加权类别分布的对数，形状 (2, n_classes)，截断以避免 log(0)"""
+        proba = stump.value_ / np.maximum(stump.value_.sum(axis=1, keepdims=True), 1e-300)
+        return np.log(np.clip(proba, np.finfo(np.float64).eps, None))
+
+    def train(self, X, y, X_val=None, y_val=None, patience=5):
+        """
+        训练模型
+        :param X: 特征数据
+        :param y: 标签数据
+        :param X_val: 可选的验证集特征，提供时启用早停
+        :param y_val: 验证集标签
+        :param patience: 验证集错误率连续多少轮没有改善就停止，并回退到最佳轮数
+        """
         X = np.array(X, dtype=np.float64)
-        y = np.array(y, dtype=np.float64)
+        y = np.asarray(y).ravel()
         n_samples = X.shape[0]
-        
-        # 将标签转换为-1和1
-        y_transformed = np.where(y == 0, -1, 1)
+
+        # 每个特征只排序一次，之后每轮按当前权重训练一个决策桩
+        learner = _StumpLearner(X, y)
+        self.classes_ = learner.classes_
+        self.n_classes_ = K = len(self.classes_)
+        codes = learner._codes
+        rows = np.arange(n_samples)
+
+        if X_val is not None:
+            if y_val is None:
+                raise ValueError("提供验证集特征时必须同时提供验证集标签")
+            if patience < 1:
+                raise ValueError("patience 必须为正整数")
+            X_val = np.asarray(X_val, dtype=np.float64)
+            y_val = np.asarray(y_val).ravel()
+            val_margins = np.zeros((len(y_val), K))
+            best_val_error, best_round = np.inf, 0
         
         # 初始化样本权重（确保是numpy数组）
         sample_weights = np.full(n_samples, (1 / n_samples), dtype=np.float64)
         
         self.estimators = []
         self.estimator_weights = []
+        self.training_errors_ = []
+        self.validation_errors_ = []
+        self.stop_reason_ = 'max_estimators'
+        tables = []
+        # 训练集上的集成得分随每轮增量更新，不再重新预测之前的弱分类器
+        margins = np.zeros((n_samples, K))
         
         for _ in range(self.n_estimators):
-            estimator = DecisionTree(max_depth=1)
-            estimator.train(X, y_transformed, sample_weights)
-            
-            # 预测并确保结果是numpy数组
-            y_pred = np.array(estimator.predict(X), dtype=np.float64)
-            
-            # 计算错误率（确保所有操作数都是numpy数组）
-            incorrect = (y_pred != y_transformed).astype(np.float64)
-            error = np.sum(sample_weights * incorrect) / np.sum(sample_weights)
-            
-            # 计算分类器权重
-            estimator_weight = 0.5 * np.log((1 - error) / (error + 1e-10))
-            
-            # 更新样本权重
-            sample_weights *= np.exp(-estimator_weight * y_transformed * y_pred)
+            estimator = learner.fit(sample_weights)
+            leaf = estimator.apply(X)
+            y_pred = np.argmax(estimator.value_, axis=1)[leaf]
+            incorrect = y_pred != codes
+            error = np.sum(sample_weights[incorrect]) / np.sum(sample_weights)
+
+            # 不优于随机猜测的弱分类器只会得到非正的权重，继续训练没有意义
+            if error >= 1.0 - 1.0 / K:
+                if not self.estimators:
+                    raise ValueError("第一个弱分类器的错误率已不低于随机猜测，无法训练")
+                self.stop_reason_ = 'weak_learner_too_weak'
+                break
+
+            if self.algorithm == 'SAMME':
+                # 计算分类器权重（多分类时额外加上 log(K-1)）
+                estimator_weight = np.log((1 - error) / (error + 1e-10)) + np.log(max(K - 1, 1))
+
+                # 更新样本权重：只放大分错的样本
+                sample_weights *= np.exp(estimator_weight * incorrect)
+                table = np.zeros((2, K))
+                table[[0, 1], np.argmax(estimator.value_, axis=1)] = estimator_weight
+            else:
+                # 得分表 h_k = (K-1) * (log p_k - mean(log p))，p 为叶内加权类别分布
+                log_proba = self._leaf_log_proba(estimator)
+                table = (K - 1) * (log_proba - log_proba.mean(axis=1, keepdims=True))
+                # y_k 在正确类别处为 1，其余为 -1/(K-1)；权重按 exp(-(K-1)/K * y·log p) 更新
+                coding = np.full((n_samples, K), -1.0 / max(K - 1, 1))
+                coding[rows, codes] = 1.0
+                sample_weights *= np.exp(-(K - 1) / K * np.sum(coding * log_proba[leaf], axis=1))
+                estimator_weight = 1.0
+
             sample_weights = np.maximum(sample_weights, 1e-10)  # 确保非负
             sample_weights /= np.sum(sample_weights)  # 归一化
+
+            margins += table[leaf]
+            self.training_errors_.append(float(np.mean(np.argmax(margins, axis=1) != codes)))
             
             self.estimators.append(estimator)
-            self.estimator_weights.append(estimator_weight)
-            
-    def predict(self, X):
+            self.estimator_weights.append(float(estimator_weight))
+            tables.append(table)
+
+            # 先在验证集上评估本轮，使零错误率提前停止的这一轮也能被选为最佳轮数
+            if X_val is not None:
+                val_margins += table[estimator.apply(X_val)]
+                val_error = float(np.mean(self.classes_[np.argmax(val_margins, axis=1)] != y_val))
+                self.validation_errors_.append(val_error)
+                if val_error < best_val_error:
+                    best_val_error, best_round = val_error, len(self.estimators)
+                elif len(self.estimators) - best_round >= patience:
+                    self.stop_reason_ = 'validation_plateau'
+                    break
+
+            # 完美分类训练集（加权错误率为 0）后样本权重不再变化，之后每轮都会得到同一个弱分类器
+            if error <= 0:
+                self.stop_reason_ = 'zero_error'
+                break
+
+        self.stopped_round_ = len(self.estimators)
+        if X_val is not None and 0 < best_round < len(self.estimators):
+            # 早停后回退到验证集错误率最低的轮数
+            del self.estimators[best_round:], self.estimator_weights[best_round:], tables[best_round:]
+        self.score_tables_ = np.array(tables).reshape(-1, 2, K)
+
+    def _leaf_matrix(self, X):
+        """所有弱分类器的叶编号，形状 (n_samples, n_estimators)，一次向量化比较得到"""
         if not self.estimators:
             raise RuntimeError("模型尚未训练，请先调用train方法")
+        X = np.asarray(X, dtype=np.float64)
+        features = np.array([estimator.feature_ for estimator in self.estimators])
+        thresholds = np.array([estimator.threshold_ for estimator in self.estimators])
+        return (X[:, features] >= thresholds).astype(np.int64)
+
+    def decision_function(self, X):
+        """返回各类别的集成得分，形状 (n_samples, n_classes)"""
+        leaf = self._leaf_matrix(X)
+        return self.score_tables_[np.arange(leaf.shape[1]), leaf].sum(axis=1)
+
+    def staged_decision_function(self, X):
+        """逐轮产出集成得分：在上一轮的得分上累加当前弱分类器的得分表，每轮 O(n·K)
+
+        每轮产出一个新数组，调用方可以保存各轮的得分。
+        """
+        leaf = self._leaf_matrix(X)
+        scores = np.zeros((leaf.shape[0], self.n_classes_))
+        for m in range(leaf.shape[1]):
+            scores = scores + self.score_tables_[m][leaf[:, m]]
+            yield scores
+
+    def staged_predict(self, X):
+        """逐轮产出只使用前 m 个弱分类器的预测结果，可用于绘制学习曲线"""
+        for scores in self.staged_decision_function(X):
+            yield self.classes_[np.argmax(scores, axis=1)]
             
-        X = np.array(X, dtype=np.float64)
-        final_pred = np.zeros(X.shape[0], dtype=np.float64)
-        
-        # 累加所有弱分类器的加权预测
-        for estimator, weight in zip(self.estimators, self.estimator_weights):
-            # 确保预测结果是numpy数组
-            y_pred = np.array(estimator.predict(X), dtype=np.float64)
-            final_pred += weight * y_pred  # 现在两边都是numpy类型
-            
-        # 将结果转换为0和1
-        return np.where(np.sign(final_pred) == 1, 1, 0)
+    def predict(self, X):
+        return self.classes_[np.argmax(self.decision_function(X), axis=1)]
         
     def get_visualization_data(self):
         if not self.estimators:
@@ -66,8 +244,12 @@ class AdaBoost:
             
         return {
             'n_estimators': self.n_estimators,
+            'algorithm': self.algorithm,
+            'n_classes': self.n_classes_,
             'estimator_weights': self.estimator_weights,
-            'estimator_count': len(self.estimators)
+            'estimator_count': len(self.estimators),
+            'stopped_round': self.stopped_round_,
+            'stop_reason': self.stop_reason_,
+            'training_errors': self.training_errors_,
+            'validation_errors': self.validation_errors_
         }
-
-
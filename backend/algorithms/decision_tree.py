@@ -1,181 +1,337 @@
-import math
-import random
-from collections import defaultdict
-from backend.utils import entropy, gini_impurity, split_dataset, majority_vote
+from backend.utils import majority_vote
 import numpy as np
 
-class DecisionTreeNode:
-    """决策树节点"""
-    def __init__(self, feature_idx=None, threshold=None, left=None, right=None, value=None):
-        self.feature_idx = feature_idx  # 用于分割的特征索引
-        self.threshold = threshold      # 分割阈值
-        self.left = left                # 左子树（特征值 < 阈值）
-        self.right = right              # 右子树（特征值 >= 阈值）
-        self.value = value              # 叶节点的预测值
-
 class DecisionTree:
     """决策树算法实现"""
-    def __init__(self, max_depth=5, min_samples_split=2, criterion='gini'):
+    def __init__(self, max_depth=5, min_samples_split=2, criterion='gini', max_bins=None):
         self.max_depth = max_depth          # 树的最大深度
         self.min_samples_split = min_samples_split  # 最小分裂样本数
         self.criterion = criterion          # 不纯度计算标准：'gini' 或 'entropy'
-        self.root = None                    # 根节点
+        self.max_bins = max_bins            # 特征预分箱的最大箱数（不超过256），None 表示精确搜索所有取值
+        self.bin_edges_ = None              # 分箱边界，形状 (n_features, max_bins-1)，不足处以 inf 填充
+        # 扁平数组表示的树（下标为节点编号，0 为根节点；叶节点 feature_ 为 -1，value_ 为类别编号）
+        self.feature_ = None                # 分割特征索引
+        self.threshold_ = None              # 分割阈值（左子树为特征值 < 阈值）
+        self.left_ = None                   # 左子节点编号
+        self.right_ = None                  # 右子节点编号
+        self.value_ = None                  # 叶节点预测的类别编号
+        self.depth_ = 0                     # 树的深度
+        self.classes_ = None                # 训练集中的类别（有序）
+        self.n_classes_ = 0
+        # 以下仅在训练期间使用：特征矩阵、标签编号、标签独热编码（已乘样本权重）、样本权重、各节点共享的样本索引数组
+        self._X = None
+        self._codes = None
+        self._y = None
+        self._one_hot = None
+        self._weights = None
+        self._indices = None
         
-    def _calculate_impurity(self, labels):
-        """计算不纯度"""
+    def _calculate_impurity(self, counts):
+        """根据类别计数计算不纯度，counts 形状为 (..., n_classes)，按最后一维计算"""
+        totals = counts.sum(axis=-1, keepdims=True)
+        probs = counts / np.maximum(totals, 1e-12)
         if self.criterion == 'gini':
-            return gini_impurity(labels)
+            return 1.0 - np.sum(probs ** 2, axis=-1)
         elif self.criterion == 'entropy':
-            return entropy(labels)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                log_probs = np.where(probs > 0, np.log2(probs), 0.0)
+            return -np.sum(probs * log_probs, axis=-1)
         else:
             raise ValueError(f"不支持的不纯度计算标准: {self.criterion}")
-    
-    def _find_best_split(self, features, labels):
-        """寻找最佳分裂点"""
+
+    def _find_best_split(self, start, end):
+        """寻找 self._indices[start:end] 这段样本的最佳分裂点
+
+        每个特征只排序一次，沿排序顺序累加类别计数，即可一次性得到所有候选阈值
+        左右子节点的类别分布，再向量化计算全部候选的信息增益。
+        """
         best_gain = -1
         best_feature_idx = None
         best_threshold = None
-        num_samples, num_features = len(features), len(features[0]) if features else 0
-        
+        sample_idx = self._indices[start:end]
+        num_features = self._X.shape[1]
+
+        one_hot = self._one_hot[sample_idx]
+        parent_counts = one_hot.sum(axis=0)
+        total_weight = parent_counts.sum()
+
         # 计算父节点的不纯度
-        parent_impurity = self._calculate_impurity(labels)
-        
+        parent_impurity = self._calculate_impurity(parent_counts)
+
         # 遍历每个特征
         for feature_idx in range(num_features):
-            # 获取该特征的所有值
-            feature_values = [features[i][feature_idx] for i in range(num_samples)]
-            thresholds = list(set(feature_values))  # 唯一值作为可能的阈值
-            
-            # 遍历每个可能的阈值
-            for threshold in thresholds:
-                # 分割数据集
-                left_features, left_labels, right_features, right_labels = split_dataset(
-                    features, labels, feature_idx, threshold
-                )
-                
-                # 如果分割后某一子集为空，则跳过
-                if len(left_labels) == 0 or len(right_labels) == 0:
-                    continue
-                
-                # 计算信息增益
-                left_impurity = self._calculate_impurity(left_labels)
-                right_impurity = self._calculate_impurity(right_labels)
-                
-                # 加权不纯度
-                weighted_impurity = (len(left_labels) / num_samples) * left_impurity + \
-                                   (len(right_labels) / num_samples) * right_impurity
-                
-                # 信息增益 = 父节点不纯度 - 子节点加权不纯度
-                gain = parent_impurity - weighted_impurity
-                
-                # 更新最佳分裂点
-                if gain > best_gain:
-                    best_gain = gain
-                    best_feature_idx = feature_idx
-                    best_threshold = threshold
-        
+            values = self._X[sample_idx, feature_idx]
+            order = np.argsort(values, kind='stable')
+            sorted_values = values[order]
+
+            # 阈值取右侧第一个样本的值（左子树为特征值 < 阈值），相邻值相同时不能在此处分割
+            valid = sorted_values[1:] > sorted_values[:-1]
+            if not valid.any():
+                continue
+
+            # 第 i 个候选把排序后的前 i+1 个样本分到左子树（计数按样本权重累加）
+            left_counts = np.cumsum(one_hot[order], axis=0)[:-1]
+            right_counts = parent_counts - left_counts
+            n_left = left_counts.sum(axis=1)
+            n_right = total_weight - n_left
+
+            # 加权不纯度，信息增益 = 父节点不纯度 - 子节点加权不纯度
+            weighted_impurity = (n_left / total_weight) * self._calculate_impurity(left_counts) + \
+                                (n_right / total_weight) * self._calculate_impurity(right_counts)
+            gain = np.where(valid, parent_impurity - weighted_impurity, -np.inf)
+
+            # 更新最佳分裂点
+            candidate = int(np.argmax(gain))
+            if gain[candidate] > best_gain:
+                best_gain = gain[candidate]
+                best_feature_idx = feature_idx
+                best_threshold = sorted_values[candidate + 1]
+
         return best_feature_idx, best_threshold, best_gain
-    
-    def _build_tree(self, features, labels, depth=0):
-        """递归构建决策树"""
-        num_samples = len(features)
+
+    def _bin_features(self, features):
+        """按分位数把每个特征量化为不超过 max_bins 个箱，返回 uint8 箱编号矩阵
+
+        箱编号为不超过特征值的边界个数，因此“箱编号 <= b”等价于“特征值 < bin_edges_[j, b]”，
+        分箱后找到的分裂点可以直接作为原始特征上的阈值使用。
+        """
+        num_samples, num_features = features.shape
+        self.bin_edges_ = np.full((num_features, self.max_bins - 1), np.inf)
+        codes = np.empty((num_samples, num_features), dtype=np.uint8)
+        for feature_idx in range(num_features):
+            values = features[:, feature_idx]
+            unique_values = np.unique(values)
+            if len(unique_values) <= self.max_bins:
+                # 取值不多时每个取值单独一箱，与精确搜索的候选阈值完全相同
+                edges = unique_values[1:]
+            else:
+                quantiles = np.linspace(0, 1, self.max_bins + 1)[1:-1]
+                edges = np.unique(np.quantile(values, quantiles))
+            self.bin_edges_[feature_idx, :len(edges)] = edges
+            codes[:, feature_idx] = np.searchsorted(edges, values, side='right')
+        return codes
+
+    def _node_histogram(self, start, end):
+        """统计 [start, end) 样本在每个 (特征, 箱, 类别) 上的计数，形状 (n_features, max_bins, n_classes)"""
+        sample_idx = self._indices[start:end]
+        num_features = self._codes.shape[1]
+        stride = self.max_bins * self.n_classes_
+        flat = (np.arange(num_features) * stride)[None, :] + \
+               self._codes[sample_idx].astype(np.int64) * self.n_classes_ + self._y[sample_idx][:, None]
+        weights = None
+        if self._weights is not None:
+            weights = np.repeat(self._weights[sample_idx], num_features)
+        hist = np.bincount(flat.ravel(), weights=weights, minlength=num_features * stride)
+        return hist.reshape(num_features, self.max_bins, self.n_classes_).astype(np.float64)
+
+    def _find_best_split_binned(self, hist):
+        """在节点直方图上寻找最佳分裂点，所有特征的所有箱边界一次向量化评估
+
+        代价只与特征数和箱数有关，与样本数和特征取值个数无关。
+        返回 (特征索引, 箱编号, 信息增益)，左子树为箱编号 <= 该箱的样本。
+        """
+        parent_counts = hist[0].sum(axis=0)
+        num_samples = parent_counts.sum()
+        parent_impurity = self._calculate_impurity(parent_counts)
+
+        left_counts = np.cumsum(hist, axis=1)[:, :-1, :]
+        right_counts = parent_counts - left_counts
+        n_left = left_counts.sum(axis=-1)
+        n_right = num_samples - n_left
+
+        weighted_impurity = (n_left / num_samples) * self._calculate_impurity(left_counts) + \
+                            (n_right / num_samples) * self._calculate_impurity(right_counts)
+        gain = np.where((n_left > 0) & (n_right > 0), parent_impurity - weighted_impurity, -np.inf)
+
+        feature_idx, split_bin = np.unravel_index(int(np.argmax(gain)), gain.shape)
+        best_gain = gain[feature_idx, split_bin]
+        if not np.isfinite(best_gain):
+            # 标签不纯但没有任何可分的边界（例如特征完全相同、标签冲突的样本），由调用方生成叶节点
+            return int(feature_idx), int(split_bin), best_gain
+        # 直到右侧第一个非空箱之前的边界都给出相同的划分，取最靠右的一个，
+        # 使阈值与精确搜索一致地落在右子节点的最小取值上
+        nonempty = np.flatnonzero(hist[feature_idx, split_bin + 1:].sum(axis=-1))
+        split_bin += int(nonempty[0])
+        return int(feature_idx), int(split_bin), best_gain
+
+    def _partition(self, start, end, feature_idx, threshold, split_bin=None):
+        """在共享索引数组上原地划分 [start, end)，左段为特征值 < 阈值的样本，返回分界位置"""
+        segment = self._indices[start:end]
+        if split_bin is not None:
+            mask = self._codes[segment, feature_idx] <= split_bin
+        else:
+            mask = self._X[segment, feature_idx] < threshold
+        segment[:] = np.concatenate((segment[mask], segment[~mask]))
+        return start + int(np.count_nonzero(mask))
+
+    def _add_node(self, feature_idx=-1, threshold=0.0, value=-1):
+        """追加一个节点，返回其编号；子节点编号在子树建好后回填"""
+        self._nodes_feature.append(feature_idx)
+        self._nodes_threshold.append(threshold)
+        self._nodes_left.append(-1)
+        self._nodes_right.append(-1)
+        self._nodes_value.append(value)
+        return len(self._nodes_feature) - 1
+
+    def _leaf_value(self, start, end, labels):
+        """叶节点取样本数（带权重时为权重之和）最多的类别"""
+        if self._weights is None:
+            return majority_vote(labels)
+        return int(np.argmax(np.bincount(labels, weights=self._weights[self._indices[start:end]])))
+
+    def _build_tree(self, start, end, depth=0, hist=None):
+        """递归构建决策树，节点只持有共享索引数组 self._indices 上的区间 [start, end)，返回节点编号
+
+        分箱模式下 hist 为该节点的直方图（由父节点传入，根节点为 None 时现算）。
+        """
+        num_samples = end - start
+        labels = self._y[self._indices[start:end]]
         num_unique_labels = len(np.unique(labels))
-        
-        if (depth >= self.max_depth or 
-            num_samples < self.min_samples_split or 
+
+        if (depth >= self.max_depth or
+            num_samples < self.min_samples_split or
             num_unique_labels == 1):
             # 创建叶节点
-            leaf_value = majority_vote(labels)
-            return DecisionTreeNode(value=leaf_value)
-        
+            return self._add_node(value=self._leaf_value(start, end, labels))
+
         # 寻找最佳分裂点
-        best_feature_idx, best_threshold, best_gain = self._find_best_split(features, labels)
-        
+        split_bin = None
+        if self._codes is not None:
+            if hist is None:
+                hist = self._node_histogram(start, end)
+            best_feature_idx, split_bin, best_gain = self._find_best_split_binned(hist)
+            best_threshold = self.bin_edges_[best_feature_idx, split_bin]
+        else:
+            best_feature_idx, best_threshold, best_gain = self._find_best_split(start, end)
+
         # 如果没有找到有意义的分裂点，创建叶节点
         if best_gain <= 0:
-            leaf_value = majority_vote(labels)
-            return DecisionTreeNode(value=leaf_value)
-        
+            return self._add_node(value=self._leaf_value(start, end, labels))
+
         # 分割数据集
-        left_features, left_labels, right_features, right_labels = split_dataset(
-            features, labels, best_feature_idx, best_threshold
-        )
-        
-        # 递归构建左右子树
-        left_subtree = self._build_tree(left_features, left_labels, depth + 1)
-        right_subtree = self._build_tree(right_features, right_labels, depth + 1)
-        
-        # 返回当前节点
-        return DecisionTreeNode(
-            feature_idx=best_feature_idx,
-            threshold=best_threshold,
-            left=left_subtree,
-            right=right_subtree
-        )
-    
+        mid = self._partition(start, end, best_feature_idx, best_threshold, split_bin)
+
+        # 分箱模式下只统计较小子节点的直方图，较大子节点 = 父节点 - 较小子节点
+        left_hist = right_hist = None
+        if hist is not None and depth + 1 < self.max_depth:
+            if mid - start <= end - mid:
+                left_hist = self._node_histogram(start, mid)
+                right_hist = hist - left_hist
+            else:
+                right_hist = self._node_histogram(mid, end)
+                left_hist = hist - right_hist
+            hist = None  # 子节点直方图已得到，父节点直方图不再需要
+
+        # 先创建当前节点，再递归构建左右子树
+        node = self._add_node(feature_idx=best_feature_idx, threshold=best_threshold)
+        self._nodes_left[node] = self._build_tree(start, mid, depth + 1, left_hist)
+        self._nodes_right[node] = self._build_tree(mid, end, depth + 1, right_hist)
+        return node
+
     def train(self, features, labels, sample_weights=None):
-        import numpy as np
-        
-        features = np.array(features).tolist()
-        labels = np.array(labels).ravel().tolist()
-        
-        # 关键修复：将 -1/1 标签映射为 0/1
-        if set(labels) == {-1, 1}:
-            labels = [0 if x == -1 else 1 for x in labels]
-            
-        # 处理权重参数
-        # if sample_weights is not None:
-        #     # 这里可以实现加权不纯度计算
-        #     print("：权重参数已接收但尚未实现")
-            
+        # 整个训练过程只保留一份连续的特征矩阵和标签向量
+        features = np.ascontiguousarray(features, dtype=np.float64)
+        labels = np.asarray(labels).ravel()
+
         if len(features) == 0:
             raise ValueError("训练数据不能为空")
         if len(features) != len(labels):
             raise ValueError("特征和标签数量必须相同")
-        
-        self.root = self._build_tree(features, labels)
-    
-    def _predict_sample(self, sample, node):
-        """预测单个样本"""
-        # 如果是叶节点，返回其值
-        if node.value is not None:
-            return node.value
-        
-        # 否则递归预测
-        feature_value = sample[node.feature_idx]
-        if feature_value < node.threshold:
-            return self._predict_sample(sample, node.left)
+
+        # 样本权重：不纯度、信息增益和叶节点取值都按权重之和代替样本数计算
+        if sample_weights is not None:
+            sample_weights = np.asarray(sample_weights, dtype=np.float64).ravel()
+            if len(sample_weights) != len(labels):
+                raise ValueError("样本权重和标签数量必须相同")
+            if np.any(sample_weights < 0) or sample_weights.sum() <= 0:
+                raise ValueError("样本权重必须非负且总和大于0")
+
+        # 标签编码为 0..n_classes-1，叶节点再映射回原始标签（如 -1/1）
+        self.classes_, labels = np.unique(labels, return_inverse=True)
+        self.n_classes_ = len(self.classes_)
+
+        if self.max_bins is not None:
+            if not 2 <= self.max_bins <= 256:
+                raise ValueError("max_bins 必须在 2 到 256 之间")
+            # 分箱模式只保留 uint8 箱编号，不再持有 float64 特征矩阵
+            self._codes = self._bin_features(features)
+            self._X = None
         else:
-            return self._predict_sample(sample, node.right)
-    
+            self._X = features
+            self._one_hot = np.eye(self.n_classes_)[labels]
+            if sample_weights is not None:
+                self._one_hot *= sample_weights[:, None]
+        self._y = labels
+        self._weights = sample_weights
+        self._indices = np.arange(len(labels))
+        self._nodes_feature, self._nodes_threshold = [], []
+        self._nodes_left, self._nodes_right, self._nodes_value = [], [], []
+        try:
+            self._build_tree(0, len(labels))
+            self.feature_ = np.array(self._nodes_feature, dtype=np.int64)
+            self.threshold_ = np.array(self._nodes_threshold, dtype=np.float64)
+            self.left_ = np.array(self._nodes_left, dtype=np.int64)
+            self.right_ = np.array(self._nodes_right, dtype=np.int64)
+            self.value_ = np.array(self._nodes_value, dtype=np.int64)
+            self.depth_ = self._compute_depth()
+        finally:
+            # 训练结束后不再持有训练数据和构建用的临时列表
+            self._X = self._codes = self._y = self._one_hot = self._weights = self._indices = None
+            self._nodes_feature = self._nodes_threshold = None
+            self._nodes_left = self._nodes_right = self._nodes_value = None
+
+    def _compute_depth(self):
+        """计算树的深度（根节点深度为0）"""
+        depth = np.zeros(len(self.feature_), dtype=np.int64)
+        # 节点按先序编号，父节点编号总小于子节点
+        for node in np.where(self.feature_ >= 0)[0]:
+            depth[self.left_[node]] = depth[self.right_[node]] = depth[node] + 1
+        return int(depth.max())
+
+    def apply(self, features):
+        """返回每个样本落入的叶节点编号：整批样本按层同步下移，每层一次向量化判断"""
+        X = np.asarray(features, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        node = np.zeros(X.shape[0], dtype=np.int64)
+        rows = np.arange(X.shape[0])
+        for _ in range(self.depth_):
+            feature = self.feature_[node]
+            internal = feature >= 0
+            if not internal.any():
+                break
+            go_left = X[rows, np.where(internal, feature, 0)] < self.threshold_[node]
+            node = np.where(internal, np.where(go_left, self.left_[node], self.right_[node]), node)
+        return node
+
     def predict(self, features):
         """预测多个样本"""
-        if self.root is None:
+        if self.feature_ is None:
             raise RuntimeError("决策树尚未训练，请先调用train方法")
-        
-        return [self._predict_sample(sample, self.root) for sample in features]
-    
+
+        return self.classes_[self.value_[self.apply(features)]]
+
     def get_visualization_data(self):
         """获取决策树可视化数据"""
-        if self.root is None:
+        if self.feature_ is None:
             return None
-            
-        # 递归构建树的可视化结构
+
+        # 由节点数组递归构建树的可视化结构
         def build_tree_data(node, depth=0):
-            if node.value is not None:
+            if self.feature_[node] < 0:
                 return {
                     'type': 'leaf',
-                    'value': node.value,
+                    'value': self.classes_[self.value_[node]],
                     'depth': depth
                 }
             else:
                 return {
                     'type': 'node',
-                    'feature_idx': node.feature_idx,
-                    'threshold': node.threshold,
-                    'left': build_tree_data(node.left, depth + 1),
-                    'right': build_tree_data(node.right, depth + 1),
+                    'feature_idx': int(self.feature_[node]),
+                    'threshold': float(self.threshold_[node]),
+                    'left': build_tree_data(self.left_[node], depth + 1),
+                    'right': build_tree_data(self.right_[node], depth + 1),
                     'depth': depth
                 }
-        
-        return build_tree_data(self.root)
+
+        return build_tree_data(0)
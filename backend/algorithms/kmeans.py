@@ -3,14 +3,17 @@ import random
 
 class KMeans:
     """K均值聚类算法实现"""
-    def __init__(self, k=2, max_iters=100):
+    def __init__(self, k=2, max_iters=100, random_state=None):
         """
         初始化KMeans模型
         :param k: 聚类数量
         :param max_iters: 最大迭代次数
+        :param random_state: 随机种子，控制初始中心和空簇重新选取的中心；None 表示使用全局 random 模块
         """
         self.k = k
         self.max_iters = max_iters
+        self.random_state = random_state
+        self._random = random
         self.centroids = None  # 聚类中心
         self.clusters = None   # 聚类结果
         self.X = None          # 保存训练数据，移到这里作为类属性
@@ -21,24 +24,24 @@ class KMeans:
         centroids = np.zeros((self.k, n_features))
         
         # 随机选择k个不同的样本作为初始中心
-        indices = random.sample(range(n_samples), self.k)
+        indices = self._random.sample(range(n_samples), self.k)
         for i, idx in enumerate(indices):
             centroids[i] = X[idx]
             
         return centroids
         
+    def _closest_centroids(self, X, centroids):
+        """一次矩阵运算求每个样本最近的聚类中心索引"""
+        # ||x-c||^2 = ||x||^2 - 2xc + ||c||^2，||x||^2 对同一样本是常数，求 argmin 时可省略
+        sq_dist = -2.0 * (X @ centroids.T) + np.einsum('ij,ij->i', centroids, centroids)[None, :]
+        return np.argmin(sq_dist, axis=1)
+
     def _assign_clusters(self, X, centroids):
         """将样本分配到最近的聚类中心"""
-        clusters = [[] for _ in range(self.k)]
-        
-        for idx, sample in enumerate(X):
-            # 计算到每个中心的距离
-            distances = [np.linalg.norm(sample - centroid) for centroid in centroids]
-            # 找到最近的中心
-            closest_centroid_idx = np.argmin(distances)
-            clusters[closest_centroid_idx].append(idx)
-            
-        return clusters
+        labels = self._closest_centroids(X, centroids)
+        order = np.argsort(labels, kind='stable')
+        bounds = np.cumsum(np.bincount(labels, minlength=self.k))[:-1]
+        return [idx.tolist() for idx in np.split(order, bounds)]
         
     def _update_centroids(self, X, clusters):
         n_samples, n_features = X.shape
@@ -60,12 +63,12 @@ class KMeans:
             unused_indices = list(set(range(n_samples)) - used_indices)
             if unused_indices:
                 # 从未被选中的样本中随机选择
-                new_centroid_indices = random.sample(unused_indices, len(empty_clusters))
+                new_centroid_indices = self._random.sample(unused_indices, len(empty_clusters))
                 for i, idx in zip(empty_clusters, new_centroid_indices):
                     centroids[i] = X[idx]
             else:
                 # 所有样本都已被使用，从整个数据集随机选择
-                new_centroid_indices = random.sample(range(n_samples), len(empty_clusters))
+                new_centroid_indices = self._random.sample(range(n_samples), len(empty_clusters))
                 for i, idx in zip(empty_clusters, new_centroid_indices):
                     centroids[i] = X[idx]
                     
@@ -86,6 +89,8 @@ class KMeans:
         
         # 保存原始数据（关键修改：移到循环外面，确保一定会保存）
         self.X = X.copy()
+        # 每次训练都从同一个种子开始，相同数据上的结果可复现
+        self._random = random if self.random_state is None else random.Random(self.random_state)
                 
         # 初始化聚类中心
         self.centroids = self._initialize_centroids(X)
@@ -114,15 +119,8 @@ class KMeans:
         if self.centroids is None:
             raise RuntimeError("模型尚未训练，请先调用train方法")
             
-        X = np.array(X)
-        predictions = []
-        
-        for sample in X:
-            distances = [np.linalg.norm(sample - centroid) for centroid in self.centroids]
-            closest_centroid_idx = np.argmin(distances)
-            predictions.append(closest_centroid_idx)
-            
-        return np.array(predictions)
+        X = np.array(X, dtype=np.float64)
+        return self._closest_centroids(X, self.centroids)
         
     def get_visualization_data(self):
         if self.centroids is None or self.clusters is None or self.X is None:
@@ -1,72 +1,501 @@
-import math
-from collections import defaultdict
-from backend.utils import euclidean_distance, manhattan_distance, majority_vote
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from backend.utils import count_votes, resolve_n_workers
+from .kmeans import KMeans
+
+
+def _pairwise_distances(X, Y, metric='euclidean', Y_sq_norms=None):
+    """计算 X 中每个样本到 Y 中每个样本的距离矩阵，形状为 (len(X), len(Y))"""
+    if metric == 'euclidean':
+        if Y_sq_norms is None:
+            Y_sq_norms = np.einsum('ij,ij->i', Y, Y)
+        # ||a-b||^2 = ||a||^2 - 2ab + ||b||^2，一次矩阵乘法完成
+        sq = np.einsum('ij,ij->i', X, X)[:, None] - 2.0 * (X @ Y.T) + Y_sq_norms[None, :]
+        np.maximum(sq, 0.0, out=sq)
+        return np.sqrt(sq, out=sq)
+    elif metric == 'manhattan':
+        # 逐特征累加，临时内存只有一个 (len(X), len(Y)) 矩阵，而不是按特征维展开的三维数组
+        dist = np.zeros((X.shape[0], Y.shape[0]))
+        for j in range(X.shape[1]):
+            dist += np.abs(X[:, j, None] - Y[None, :, j])
+        return dist
+    else:
+        raise ValueError(f"不支持的距离度量: {metric}")
+
+
+# 进程池中每个工作进程持有的模型副本（由 _init_predict_worker 在进程启动时设置一次）
+_worker_model = None
+
+
+def _init_predict_worker(model):
+    global _worker_model
+    _worker_model = model
+
+
+def _predict_block_in_worker(args):
+    block, train_block = args
+    return _worker_model._predict_block(block, train_block)
+
+
+def _merge_topk(best_dist, best_idx, dist, idx):
+    """将新一批候选距离并入每行当前的 top-k，返回合并后的 (距离, 索引)"""
+    k = best_dist.shape[1]
+    cand_dist = np.hstack([best_dist, dist])
+    cand_idx = np.hstack([best_idx, np.broadcast_to(idx, dist.shape)])
+    sel = np.argpartition(cand_dist, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(cand_dist, sel, axis=1), np.take_along_axis(cand_idx, sel, axis=1)
+
+
+class KDTree:
+    """KD树近邻索引：按方差最大的维度取中位数递归切分，节点保存轴对齐包围盒"""
+    def __init__(self, X, leaf_size=30, metric='euclidean'):
+        self.X = X
+        self.leaf_size = max(1, int(leaf_size))
+        self.metric = metric
+        self.indices = np.arange(X.shape[0])  # 训练样本的重排索引，每个节点对应其中一段连续区间
+        self.depth = 0
+
+        self._start, self._end, self._left, self._right, self._bounds = [], [], [], [], []
+        self._build(0, X.shape[0], 0)
+        self.start = np.array(self._start)
+        self.end = np.array(self._end)
+        self.left = np.array(self._left)
+        self.right = np.array(self._right)
+        self._finalize_bounds()
+
+    def _node_bounds(self, points):
+        """计算节点的包围信息"""
+        return points.min(axis=0), points.max(axis=0)
+
+    def _finalize_bounds(self):
+        self.lower = np.array([b[0] for b in self._bounds])
+        self.upper = np.array([b[1] for b in self._bounds])
+
+    def _lower_bound(self, node, Q):
+        """查询点到节点区域的距离下界"""
+        diff = np.maximum(np.maximum(self.lower[node] - Q, Q - self.upper[node]), 0.0)
+        if self.metric == 'euclidean':
+            return np.sqrt(np.einsum('ij,ij->i', diff, diff))
+        return diff.sum(axis=1)
+
+    def _build(self, start, end, depth):
+        """递归构建子树，返回节点编号"""
+        node = len(self._start)
+        self._start.append(start)
+        self._end.append(end)
+        self._left.append(-1)
+        self._right.append(-1)
+        self.depth = max(self.depth, depth)
+
+        points = self.X[self.indices[start:end]]
+        self._bounds.append(self._node_bounds(points))
+
+        n_points = end - start
+        if n_points <= self.leaf_size:
+            return node
+
+        spread = points.max(axis=0) - points.min(axis=0)
+        split_dim = int(np.argmax(spread))
+        if spread[split_dim] <= 0:
+            return node  # 所有点重合，无法继续切分
+
+        mid = n_points // 2
+        order = np.argpartition(points[:, split_dim], mid)
+        self.indices[start:end] = self.indices[start:end][order]
+
+        self._left[node] = self._build(start, start + mid, depth + 1)
+        self._right[node] = self._build(start + mid, end, depth + 1)
+        return node
+
+    def _descend(self, Q):
+        """将每个查询点沿下界更小的分支下降到叶节点"""
+        node = np.zeros(Q.shape[0], dtype=int)
+        while True:
+            internal = self.left[node] >= 0
+            if not internal.any():
+                return node
+            for nd in np.unique(node[internal]):
+                rows = np.where(node == nd)[0]
+                left, right = self.left[nd], self.right[nd]
+                go_right = self._lower_bound(right, Q[rows]) < self._lower_bound(left, Q[rows])
+                node[rows] = np.where(go_right, right, left)
+
+    def _scan_leaf(self, node, Q, rows, best_dist, best_idx):
+        """计算 rows 对应的查询点到叶节点内所有样本的距离，并更新 top-k"""
+        points = self.indices[self.start[node]:self.end[node]]
+        dist = _pairwise_distances(Q[rows], self.X[points], self.metric)
+        best_dist[rows], best_idx[rows] = _merge_topk(best_dist[rows], best_idx[rows], dist, points)
+
+    def _visit(self, node, Q, rows, best_dist, best_idx, own_leaf):
+        """带剪枝地遍历子树：只有下界小于当前第k近距离的查询点才继续向下"""
+        radius = best_dist[rows].max(axis=1)
+        rows = rows[self._lower_bound(node, Q[rows]) < radius]
+        if rows.size == 0:
+            return
+        if self.left[node] < 0:
+            rows = rows[own_leaf[rows] != node]  # 自身所在叶节点已扫描过
+            if rows.size:
+                self._scan_leaf(node, Q, rows, best_dist, best_idx)
+            return
+        self._visit(self.left[node], Q, rows, best_dist, best_idx, own_leaf)
+        self._visit(self.right[node], Q, rows, best_dist, best_idx, own_leaf)
+
+    def query(self, Q, k):
+        """批量查询k近邻，返回按距离升序排列的 (距离, 训练集索引)"""
+        k = min(k, self.X.shape[0])
+        best_dist = np.full((Q.shape[0], k), np.inf)
+        best_idx = np.full((Q.shape[0], k), -1, dtype=int)
+
+        # 先扫描每个查询点自身所在的叶节点，得到较紧的初始搜索半径
+        own_leaf = self._descend(Q)
+        for leaf in np.unique(own_leaf):
+            self._scan_leaf(leaf, Q, np.where(own_leaf == leaf)[0], best_dist, best_idx)
+
+        self._visit(0, Q, np.arange(Q.shape[0]), best_dist, best_idx, own_leaf)
+
+        order = np.argsort(best_dist, axis=1)
+        return np.take_along_axis(best_dist, order, axis=1), np.take_along_axis(best_idx, order, axis=1)
+
+
+class BallTree(KDTree):
+    """球树近邻索引：节点保存中心和半径，下界由三角不等式给出，对两种度量都成立"""
+    def _node_bounds(self, points):
+        center = points.mean(axis=0)
+        radius = _pairwise_distances(center[None, :], points, self.metric).max()
+        return center, radius
+
+    def _finalize_bounds(self):
+        self.centers = np.array([b[0] for b in self._bounds])
+        self.radii = np.array([b[1] for b in self._bounds])
+
+    def _lower_bound(self, node, Q):
+        dist = _pairwise_distances(Q, self.centers[node][None, :], self.metric)[:, 0]
+        return np.maximum(dist - self.radii[node], 0.0)
+
+
+class IVFIndex:
+    """倒排文件索引（近似近邻）：用 KMeans 把训练集划分为 n_lists 个簇作为粗量化器，
+    查询时只扫描距离最近的 n_probes 个簇内的样本。探测的簇越多召回越高、速度越慢，
+    每次查询扫描的样本数约为 n_probes * n / n_lists，不随训练集规模线性增长。
+    """
+    def __init__(self, X, n_lists=None, n_probes=16, metric='euclidean', kmeans_iters=20,
+                 random_state=None):
+        self.X = X
+        self.metric = metric
+        n_samples = X.shape[0]
+        if n_lists is None:
+            n_lists = int(np.sqrt(n_samples))
+        self.n_lists = int(np.clip(n_lists, 1, n_samples))
+        self.n_probes = int(np.clip(n_probes, 1, self.n_lists))
+        self._sq_norms = np.einsum('ij,ij->i', X, X) if metric == 'euclidean' else None
+
+        # 粗量化器只需在子样本上训练（每簇约 30 个样本），再把全部样本分配到最近的中心
+        rng = np.random.default_rng(random_state)
+        n_train = min(n_samples, 30 * self.n_lists)
+        sample = X[rng.choice(n_samples, n_train, replace=False)]
+        quantizer = KMeans(k=self.n_lists, max_iters=kmeans_iters, random_state=int(rng.integers(2 ** 32)))
+        quantizer.train(sample)
+        self.centroids = quantizer.centroids
+        labels = quantizer.predict(X)
+
+        # 同一个簇的样本在 order 中连续，offsets[c]:offsets[c+1] 即簇 c 的倒排列表
+        self.order = np.argsort(labels, kind='stable')
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(labels, minlength=self.n_lists))))
+
+    def query(self, Q, k):
+        """批量查询近似k近邻，返回按距离升序排列的 (距离, 训练集索引)"""
+        n_queries = Q.shape[0]
+        k = min(k, self.X.shape[0])
+        best_dist = np.full((n_queries, k), np.inf)
+        best_idx = np.full((n_queries, k), -1, dtype=int)
+
+        centroid_dist = _pairwise_distances(Q, self.centroids)
+        if self.n_probes < self.n_lists:
+            probes = np.argpartition(centroid_dist, self.n_probes - 1, axis=1)[:, :self.n_probes]
+        else:
+            probes = np.broadcast_to(np.arange(self.n_lists), (n_queries, self.n_lists))
+
+        # 按簇分组查询点，每个簇与探测它的查询点做一次距离矩阵运算
+        flat_lists = probes.ravel()
+        flat_rows = np.repeat(np.arange(n_queries), probes.shape[1])
+        group = np.argsort(flat_lists, kind='stable')
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(flat_lists, minlength=self.n_lists))))
+        for c in range(self.n_lists):
+            members = self.order[self.offsets[c]:self.offsets[c + 1]]
+            rows = flat_rows[group[bounds[c]:bounds[c + 1]]]
+            if members.size == 0 or rows.size == 0:
+                continue
+            norms = self._sq_norms[members] if self._sq_norms is not None else None
+            dist = _pairwise_distances(Q[rows], self.X[members], self.metric, norms)
+            if dist.shape[1] > k:
+                sel = np.argpartition(dist, k - 1, axis=1)[:, :k]
+                dist, members = np.take_along_axis(dist, sel, axis=1), members[sel]
+            best_dist[rows], best_idx[rows] = _merge_topk(best_dist[rows], best_idx[rows], dist, members)
+
+        # 探测到的样本不足k个的查询点退化为暴力搜索，保证总能返回k个近邻
+        short = np.where(np.isinf(best_dist[:, -1]) | (best_idx[:, -1] < 0))[0]
+        if short.size:
+            full = _pairwise_distances(Q[short], self.X, self.metric, self._sq_norms)
+            sel = np.argsort(full, axis=1)[:, :k]
+            best_dist[short] = np.take_along_axis(full, sel, axis=1)
+            best_idx[short] = sel
+
+        order = np.argsort(best_dist, axis=1)
+        return np.take_along_axis(best_dist, order, axis=1), np.take_along_axis(best_idx, order, axis=1)
+
 
 class KNN:
     """K最近邻算法（支持分类和回归）"""
-    def __init__(self, k=5, distance_metric='euclidean', task_type='classification'):
+    # 树索引的遍历开销按节点计，查询块越大摊销越充分，因此使用比暴力搜索更大的块
+    TREE_QUERY_BATCH = 4096
+
+    def __init__(self, k=5, distance_metric='euclidean', task_type='classification', batch_size=256,
+                 algorithm='auto', leaf_size=40, n_lists=None, n_probes=16,
+                 recall_sample_size=100, random_state=None, memory_limit_mb=None, n_jobs=None,
+                 parallel_backend='thread'):
+        """
+        初始化KNN模型
+        :param k: 近邻数量
+        :param distance_metric: 距离度量 ('euclidean' 或 'manhattan')
+        :param task_type: 任务类型 ('classification' 或 'regression')
+        :param batch_size: 批量预测时每块测试样本的数量
+        :param algorithm: 近邻搜索方式 ('auto', 'brute', 'kd_tree', 'ball_tree' 或近似搜索 'ivf')
+        :param leaf_size: 树索引叶节点的最大样本数
+        :param n_lists: IVF 粗量化的簇数量，None 表示取 sqrt(训练样本数)
+        :param n_probes: IVF 每次查询扫描的簇数量（越多召回越高、速度越慢）
+        :param recall_sample_size: IVF 预测时抽取多少个查询与暴力搜索对比以测量召回率，0 表示不测量
+        :param random_state: IVF 粗量化器训练样本抽样的随机种子
+        :param memory_limit_mb: 暴力搜索时距离矩阵块的内存上限（MB），None 表示不限制
+        :param n_jobs: 并行预测的工作线程/进程数，None 或 1 表示串行，-1 表示使用全部CPU核
+        :param parallel_backend: 并行方式 ('thread' 或 'process')
+        """
         self.k = k
         self.distance_metric = distance_metric
         self.task_type = task_type
+        self.batch_size = batch_size
+        self.algorithm = algorithm
+        self.leaf_size = leaf_size
+        self.n_lists = n_lists
+        self.n_probes = n_probes
+        self.recall_sample_size = recall_sample_size
+        self.random_state = random_state
+        self.memory_limit_mb = memory_limit_mb
+        self.n_jobs = n_jobs
+        self.parallel_backend = parallel_backend
         self.X_train = None
         self.y_train = None
-    
+        self.classes_ = None        # 分类任务的类别（有序）
+        self._y_codes = None        # 训练标签在 classes_ 中的索引，用于 bincount 投票
+        self._train_sq_norms = None # 训练样本的平方范数，用于矩阵形式的欧氏距离
+        self._fit_algorithm = None  # 实际使用的搜索方式
+        self._index = None          # 近邻索引（brute 时为 None）
+        self.index_build_time = 0.0
+        self.recall_ = None         # IVF 最近一次预测测得的召回率
+
+    def _resolve_algorithm(self, n_samples, n_features):
+        """根据数据规模和维度选择近邻搜索方式"""
+        if self.algorithm not in ('auto', 'brute', 'kd_tree', 'ball_tree', 'ivf'):
+            raise ValueError(f"不支持的近邻搜索方式: {self.algorithm}")
+        if self.algorithm != 'auto':
+            return self.algorithm
+        # 低维数据树索引剪枝效果好；高维时剪枝失效，k接近样本数时也无剪枝可言，此时暴力搜索更快
+        # 近似搜索会改变结果，只在显式指定时使用
+        if n_features > 15 or self.k >= n_samples // 2:
+            return 'brute'
+        return 'kd_tree'
+
     def fit(self, features, labels):
-        """训练KNN模型（存储数据）"""
+        """训练KNN模型（存储数据并按需构建近邻索引）"""
         if len(features) != len(labels):
             raise ValueError("特征和标签的数量必须相同")
-        
+
         if len(features) == 0:
             raise ValueError("数据集不能为空")
-        
-        self.X_train = features
-        self.y_train = labels
-    
+
+        if self.distance_metric not in ('euclidean', 'manhattan'):
+            raise ValueError(f"不支持的距离度量: {self.distance_metric}")
+
+        self.X_train = np.asarray(features, dtype=np.float64)
+        self.y_train = np.asarray(labels).ravel()
+
+        if self.task_type == 'classification':
+            self.classes_, self._y_codes = np.unique(self.y_train, return_inverse=True)
+        else:
+            self.y_train = self.y_train.astype(np.float64)
+
+        if self.distance_metric == 'euclidean':
+            self._train_sq_norms = np.einsum('ij,ij->i', self.X_train, self.X_train)
+
+        self._fit_algorithm = self._resolve_algorithm(*self.X_train.shape)
+        self.recall_ = None
+        start = time.perf_counter()
+        if self._fit_algorithm == 'kd_tree':
+            self._index = KDTree(self.X_train, self.leaf_size, self.distance_metric)
+        elif self._fit_algorithm == 'ball_tree':
+            self._index = BallTree(self.X_train, self.leaf_size, self.distance_metric)
+        elif self._fit_algorithm == 'ivf':
+            self._index = IVFIndex(self.X_train, self.n_lists, self.n_probes, self.distance_metric,
+                                   random_state=self.random_state)
+        else:
+            self._index = None
+        self.index_build_time = time.perf_counter() - start
+
     # 新增train方法，兼容统一接口
     def train(self, features, labels):
         """为兼容统一接口，调用fit方法"""
         self.fit(features, labels)
-    
-    def _calculate_distance(self, x1, x2):
-        """计算两个样本之间的距离"""
-        if self.distance_metric == 'euclidean':
-            return euclidean_distance(x1, x2)
-        elif self.distance_metric == 'manhattan':
-            return manhattan_distance(x1, x2)
-        else:
-            raise ValueError(f"不支持的距离度量: {self.distance_metric}")
-    
+
+    def _pairwise_distances(self, X):
+        """计算一块测试样本到全部训练样本的距离矩阵，形状为 (len(X), n_train)"""
+        return _pairwise_distances(X, self.X_train, self.distance_metric, self._train_sq_norms)
+
+    def _brute_kneighbors(self, X, train_block=None):
+        """暴力搜索k近邻：使用部分选择而非完整排序
+
+        train_block 不为 None 时按训练样本分块计算距离，只为每个查询维护当前的 top-k，
+        内存占用与训练集规模无关。
+        """
+        n_train = self.X_train.shape[0]
+        k = min(self.k, n_train)
+        if train_block is None or train_block >= n_train:
+            distances = self._pairwise_distances(X)
+            if k < n_train:
+                neighbor_idx = np.argpartition(distances, k - 1, axis=1)[:, :k].copy()
+            else:
+                neighbor_idx = np.broadcast_to(np.arange(k), (distances.shape[0], k))
+            return np.take_along_axis(distances, neighbor_idx, axis=1), neighbor_idx
+
+        best_dist = np.full((X.shape[0], k), np.inf)
+        best_idx = np.full((X.shape[0], k), -1, dtype=int)
+        for start in range(0, n_train, train_block):
+            end = min(start + train_block, n_train)
+            norms = self._train_sq_norms[start:end] if self._train_sq_norms is not None else None
+            dist = _pairwise_distances(X, self.X_train[start:end], self.distance_metric, norms)
+            idx = np.arange(start, end)
+            if end - start > k:
+                sel = np.argpartition(dist, k - 1, axis=1)[:, :k]
+                dist, idx = np.take_along_axis(dist, sel, axis=1), idx[sel]
+            best_dist, best_idx = _merge_topk(best_dist, best_idx, dist, idx)
+        return best_dist, best_idx
+
+    def _kneighbors(self, X, train_block=None):
+        """返回一块测试样本的k个近邻（距离和训练集索引）"""
+        if self._index is not None:
+            return self._index.query(X, self.k)
+        return self._brute_kneighbors(X, train_block)
+
+    def _block_sizes(self, batch_size, memory_limit_mb, n_workers):
+        """根据内存上限确定 (测试块行数, 训练块行数)；训练块为 None 表示一次使用全部训练样本"""
+        batch_size = max(1, int(batch_size))
+        if self._index is not None:
+            if isinstance(self._index, KDTree):
+                batch_size = max(batch_size, self.TREE_QUERY_BATCH)
+            return batch_size, None
+        if memory_limit_mb is None:
+            return batch_size, None
+
+        n_train = self.X_train.shape[0]
+        # 每个 (测试, 训练) 样本对的峰值内存约为 3 个 float64 临时量
+        bytes_per_pair = 8 * 3
+        budget_pairs = max(1, int(memory_limit_mb * 2 ** 20 / bytes_per_pair / n_workers))
+        test_block = max(1, min(batch_size, budget_pairs // max(1, self.k)))
+        train_block = max(self.k, budget_pairs // test_block)
+        return test_block, (train_block if train_block < n_train else None)
+
+    def _predict_block(self, block, train_block=None):
+        """预测一块测试样本，返回 (预测值, 近邻索引)"""
+        _, neighbor_idx = self._kneighbors(block, train_block)
+        return self._aggregate(neighbor_idx), neighbor_idx
+
+    def _measure_recall(self, X, neighbor_idx, train_block=None):
+        """抽样对比近似近邻与暴力搜索的结果，返回平均召回率"""
+        n_sample = min(int(self.recall_sample_size), X.shape[0])
+        if n_sample <= 0:
+            return None
+        rows = np.random.default_rng(self.random_state).choice(X.shape[0], n_sample, replace=False)
+        _, exact_idx = self._brute_kneighbors(X[rows], train_block)
+        hits = sum(np.intersect1d(a, e).size for a, e in zip(neighbor_idx[rows], exact_idx))
+        return hits / exact_idx.size
+
+    def _aggregate(self, neighbor_idx):
+        """根据近邻索引计算预测值：分类用 bincount 投票，回归取均值"""
+        if self.task_type == 'classification':
+            votes = count_votes(self._y_codes[neighbor_idx], len(self.classes_))
+            return self.classes_[np.argmax(votes, axis=1)]
+        else:  # regression
+            return self.y_train[neighbor_idx].mean(axis=1)
+
     def _predict_sample(self, sample):
         """预测单个样本"""
+        return self.predict([sample])[0]
+
+    def predict(self, features, batch_size=None, memory_limit_mb=None, n_jobs=None):
+        """
+        按块流式预测多个样本
+        :param features: 测试样本
+        :param batch_size: 每块测试样本数量，None 表示使用初始化时的设置
+        :param memory_limit_mb: 距离矩阵块的内存上限（MB），None 表示使用初始化时的设置
+        :param n_jobs: 并行工作线程/进程数，None 表示使用初始化时的设置
+        :return: 预测结果
+        """
         if self.X_train is None or self.y_train is None:
             raise ValueError("KNN模型尚未训练，请先调用fit方法")
-        
-        distances = []
-        for x, y in zip(self.X_train, self.y_train):
-            dist = self._calculate_distance(sample, x)
-            distances.append((dist, y))
-        
-        distances.sort()
-        neighbors = distances[:self.k]
-        neighbor_labels = [label for (dist, label) in neighbors]
-        
-        if self.task_type == 'classification':
-            return majority_vote(neighbor_labels)
-        else:  # regression
-            return sum(neighbor_labels) / len(neighbor_labels)
-    
-    def predict(self, features):
-        """预测多个样本"""
-        return [self._predict_sample(sample) for sample in features]
-    
+
+        X = np.asarray(features, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        batch_size = self.batch_size if batch_size is None else batch_size
+        memory_limit_mb = self.memory_limit_mb if memory_limit_mb is None else memory_limit_mb
+        n_jobs = self.n_jobs if n_jobs is None else n_jobs
+        n_workers = resolve_n_workers(n_jobs)
+
+        test_block, train_block = self._block_sizes(batch_size, memory_limit_mb, n_workers)
+        blocks = [X[start:start + test_block] for start in range(0, X.shape[0], test_block)]
+        if not blocks:
+            return np.array([], dtype=self.y_train.dtype)
+
+        n_workers = min(n_workers, len(blocks))
+        if n_workers == 1:
+            results = [self._predict_block(block, train_block) for block in blocks]
+        elif self.parallel_backend == 'process':
+            # 模型只在每个工作进程启动时序列化一次，任务只传递测试块
+            with ProcessPoolExecutor(n_workers, initializer=_init_predict_worker, initargs=(self,)) as pool:
+                results = list(pool.map(_predict_block_in_worker, [(block, train_block) for block in blocks]))
+        elif self.parallel_backend == 'thread':
+            # 距离计算和部分选择都在 numpy 内部完成并释放 GIL，线程可直接共享训练数据
+            with ThreadPoolExecutor(n_workers) as pool:
+                results = list(pool.map(lambda block: self._predict_block(block, train_block), blocks))
+        else:
+            raise ValueError(f"不支持的并行方式: {self.parallel_backend}")
+
+        if self._fit_algorithm == 'ivf':
+            self.recall_ = self._measure_recall(blocks[0], results[0][1], train_block)
+        return np.concatenate([pred for pred, _ in results])
+
     def get_visualization_data(self):
         """获取KNN可视化数据"""
         if self.X_train is None:
             return None
-            
-        return {
+
+        data = {
             'k': self.k,
             'distance_metric': self.distance_metric,
             'task_type': self.task_type,
+            'batch_size': self.batch_size,
+            'memory_limit_mb': self.memory_limit_mb,
+            'n_jobs': self.n_jobs,
+            'algorithm': self._fit_algorithm,
+            'leaf_size': self.leaf_size,
+            'index_build_time': float(self.index_build_time),
+            'index_depth': int(self._index.depth) if isinstance(self._index, KDTree) else 0,
             'train_samples_count': len(self.X_train)
-        }
\ No newline at end of file
+        }
+        if self._fit_algorithm == 'ivf':
+            data.update({
+                'n_lists': self._index.n_lists,
+                'n_probes': self._index.n_probes,
+                'recall': float(self.recall_) if self.recall_ is not None else None
+            })
+        return data
@@ -1,19 +1,43 @@
 import math
 import numpy as np
+from scipy.optimize import minimize
 
 class LogisticRegression:
     """逻辑回归分类器（支持二分类和多分类）"""
+    # 牛顿法的参数个数上限：Hessian 矩阵为 参数个数² 的稠密矩阵，只适合特征和类别都不多的情况
+    NEWTON_MAX_PARAMS = 1000
+
     def __init__(self, learning_rate=0.01, n_iterations=1000, 
                  regularization=None, lambda_param=0.01, 
-                 multi_class='ovr'):
+                 multi_class='ovr', solver='gd', tol=1e-4):
+        """
+        :param learning_rate: 梯度下降的学习率
+        :param n_iterations: 最大迭代次数
+        :param regularization: 正则化方式：None、'l1' 或 'l2'
+        :param lambda_param: 正则化强度
+        :param multi_class: 多分类策略：'ovr'（一对多，每个类别训练一个二分类器）或
+                            'multinomial'（softmax，直接优化一个 (n_features, n_classes) 权重矩阵）
+        :param solver: 求解器：'gd'（固定步长梯度下降）、'newton'（牛顿法/IRLS）或 'lbfgs'（拟牛顿法）
+        :param tol: 收敛阈值：梯度的最大分量小于 tol，或损失的相对变化小于 tol 的千分之一时停止迭代
+        """
+        if multi_class not in ('ovr', 'multinomial'):
+            raise ValueError(f"不支持的多分类策略: {multi_class}")
+        if solver not in ('gd', 'newton', 'lbfgs'):
+            raise ValueError(f"不支持的求解器: {solver}")
+        if regularization == 'l1' and solver != 'gd':
+            raise ValueError("L1 正则化不可微，只能使用 'gd' 求解器")
         self.learning_rate = learning_rate
         self.n_iterations = n_iterations
         self.regularization = regularization
         self.lambda_param = lambda_param
-        self.multi_class = multi_class  # 'ovr'表示One-vs-Rest多分类
-        self.weights = None
-        self.bias = None
+        self.solver = solver
+        self.tol = tol
+        self.n_iter_ = 0     # 实际迭代次数；一对多时为各二分类器中的最大值
+        self.multi_class = multi_class  # 'ovr'表示One-vs-Rest多分类，'multinomial'表示softmax多分类
+        self.weights = None  # 二分类时形状 (n_features,)，softmax 多分类时形状 (n_features, n_classes)
+        self.bias = None     # 二分类时为标量，softmax 多分类时形状 (n_classes,)
         self.class_mapping = None
+        self.classes_ = None
         self.classifiers = None  # 存储多分类器
     
     def _sigmoid(self, z):
@@ -27,6 +51,127 @@ class LogisticRegression:
         # 处理数组情况
         z = np.clip(z, -500, 500)  # 防止溢出
         return 1.0 / (1.0 + np.exp(-z))
+
+    @staticmethod
+    def _softmax(z):
+        """按行计算 softmax；先减去每行最大值，避免 exp 溢出"""
+        z = z - np.max(z, axis=1, keepdims=True)
+        exp_z = np.exp(z)
+        return exp_z / np.sum(exp_z, axis=1, keepdims=True)
+
+    def _penalty(self, weights, n_samples):
+        """正则项的值及其对权重的梯度"""
+        if self.regularization == 'l2':
+            return 0.5 * (self.lambda_param / n_samples) * np.sum(weights ** 2), (self.lambda_param / n_samples) * weights
+        if self.regularization == 'l1':
+            return (self.lambda_param / n_samples) * np.sum(np.abs(weights)), (self.lambda_param / n_samples) * np.sign(weights)
+        return 0.0, 0.0
+
+    def _loss_and_gradient(self, params, features, targets):
+        """
+        平均交叉熵损失（含正则项）及其梯度
+        :param params: 展平的参数矩阵 [W; b]，形状 ((n_features + 1) * n_outputs,)
+        :param targets: 二分类时为 (n_samples, 1) 的 0/1 标签，多分类时为 (n_samples, n_classes) 的 one-hot 矩阵
+        :return: (损失, 展平的梯度, 预测概率)
+        """
+        n_samples, n_features = features.shape
+        theta = params.reshape(n_features + 1, targets.shape[1])
+        z = features @ theta[:-1] + theta[-1]
+        if targets.shape[1] == 1:
+            # log(1 + e^z) - y·z，用 logaddexp 避免溢出
+            loss = np.mean(np.logaddexp(0.0, z) - targets * z)
+            proba = self._sigmoid(z)
+        else:
+            z_max = np.max(z, axis=1, keepdims=True)
+            log_norm = z_max[:, 0] + np.log(np.sum(np.exp(z - z_max), axis=1))
+            loss = np.mean(log_norm - np.sum(targets * z, axis=1))
+            proba = self._softmax(z)
+
+        # 交叉熵损失对 logits 的梯度为 概率 - 标签
+        error = (proba - targets) / n_samples
+        penalty, penalty_grad = self._penalty(theta[:-1], n_samples)
+        grad = np.vstack((features.T @ error + penalty_grad, np.sum(error, axis=0)))
+        return loss + penalty, grad.ravel(), proba
+
+    def _converged(self, grad, previous_loss, loss):
+        """梯度的最大分量小于 tol，或损失的相对变化小于 tol 的千分之一时认为已收敛"""
+        if np.max(np.abs(grad)) <= self.tol:
+            return True
+        return abs(previous_loss - loss) <= 1e-3 * self.tol * max(1.0, abs(loss))
+
+    def _solve_gd(self, features, targets, params):
+        """固定步长的批量梯度下降"""
+        loss, grad, _ = self._loss_and_gradient(params, features, targets)
+        for n_iter in range(1, self.n_iterations + 1):
+            params = params - self.learning_rate * grad
+            previous_loss = loss
+            loss, grad, _ = self._loss_and_gradient(params, features, targets)
+            if self._converged(grad, previous_loss, loss):
+                break
+        else:
+            n_iter = self.n_iterations
+        return params, n_iter
+
+    def _hessian(self, features, proba):
+        """交叉熵损失的 Hessian 矩阵，行列顺序与展平的参数 [W; b] 一致"""
+        n_samples, n_features = features.shape
+        augmented = np.hstack((features, np.ones((n_samples, 1))))
+        if proba.shape[1] == 1:
+            curvature = (proba * (1.0 - proba))[:, :, None]
+        else:
+            # softmax 的雅可比矩阵 diag(p) - p·pᵀ
+            curvature = proba[:, :, None] * (np.eye(proba.shape[1]) - proba[:, None, :])
+        hessian = np.einsum('ij,im,ikl->jkml', augmented, augmented, curvature, optimize=True) / n_samples
+        size = (n_features + 1) * proba.shape[1]
+        hessian = hessian.reshape(size, size)
+        if self.regularization == 'l2':
+            # 偏置不参与正则化
+            diagonal = np.arange(n_features * proba.shape[1])
+            hessian[diagonal, diagonal] += self.lambda_param / n_samples
+        return hessian
+
+    def _solve_newton(self, features, targets, params):
+        """牛顿法（IRLS）：每步求解 H·Δ = g，再回溯线搜索保证损失下降
+
+        softmax 的参数有平移不变性，数据线性可分时 Hessian 也会退化，因此用最小二乘求解牛顿方向。
+        """
+        size = params.size
+        if size > self.NEWTON_MAX_PARAMS:
+            raise ValueError(f"参数个数 {size} 过多，Hessian 矩阵过大，请使用 'lbfgs' 求解器")
+        loss, grad, proba = self._loss_and_gradient(params, features, targets)
+        n_iter = 0
+        while n_iter < self.n_iterations and np.max(np.abs(grad)) > self.tol:
+            n_iter += 1
+            direction = -np.linalg.lstsq(self._hessian(features, proba), grad, rcond=None)[0]
+            slope = grad @ direction
+            step = 1.0
+            while True:
+                candidate = params + step * direction
+                new_loss, new_grad, new_proba = self._loss_and_gradient(candidate, features, targets)
+                if new_loss <= loss + 1e-4 * step * slope or step < 1e-10:
+                    break
+                step *= 0.5
+            params, previous_loss = candidate, loss
+            loss, grad, proba = new_loss, new_grad, new_proba
+            if self._converged(grad, previous_loss, loss):
+                break
+        return params, n_iter
+
+    def _solve_lbfgs(self, features, targets, params):
+        """scipy 的 L-BFGS-B 拟牛顿法"""
+        result = minimize(
+            lambda p: self._loss_and_gradient(p, features, targets)[:2],
+            params, jac=True, method='L-BFGS-B',
+            options={'maxiter': self.n_iterations, 'gtol': self.tol, 'ftol': 1e-3 * self.tol}
+        )
+        return result.x, int(result.nit)
+
+    def _solve(self, features, targets):
+        """从零参数出发用所选求解器最小化损失，返回参数矩阵 [W; b]，形状 (n_features + 1, n_outputs)"""
+        shape = (features.shape[1] + 1, targets.shape[1])
+        solve = {'gd': self._solve_gd, 'newton': self._solve_newton, 'lbfgs': self._solve_lbfgs}[self.solver]
+        params, self.n_iter_ = solve(features, targets, np.zeros(shape[0] * shape[1]))
+        return params.reshape(shape)
     
     def fit(self, features, labels):
         """训练逻辑回归模型"""
@@ -39,46 +184,35 @@ class LogisticRegression:
         if features.shape[0] == 0:
             raise ValueError("数据集不能为空")
         
-        classes = np.unique(labels)
+        classes, codes = np.unique(labels, return_inverse=True)
+        self.classes_ = classes
         self.class_mapping = {cls: i for i, cls in enumerate(classes)}
+        self.classifiers = None
         
         # 二分类
         if len(classes) == 2:
-            y = np.array([self.class_mapping[label] for label in labels], dtype=np.float64)
-            self._fit_binary(features, y)
+            self._fit_binary(features, codes.astype(np.float64))
         # 多分类
+        elif self.multi_class == 'multinomial':
+            self._fit_multinomial(features, codes, len(classes))
         else:
-            if self.multi_class == 'ovr':
-                self._fit_ovr(features, labels, classes)
-            else:
-                raise ValueError(f"不支持的多分类策略: {self.multi_class}")
+            self._fit_ovr(features, labels, classes)
     
     def _fit_binary(self, features, y):
         """二分类训练"""
-        n_samples, n_features = features.shape
-        
-        # 初始化参数
-        self.weights = np.zeros(n_features, dtype=np.float64)
-        self.bias = 0.0
-        
-        # 梯度下降
-        for _ in range(self.n_iterations):
-            y_pred_proba = self._predict_proba_np(features)
-            
-            # 计算梯度
-            error = y_pred_proba - y
-            dw = (1 / n_samples) * np.dot(features.T, error)
-            db = (1 / n_samples) * np.sum(error)
-            
-            # 正则化
-            if self.regularization == 'l2':
-                dw += (self.lambda_param / n_samples) * self.weights
-            elif self.regularization == 'l1':
-                dw += (self.lambda_param / n_samples) * np.sign(self.weights)
-            
-            # 更新参数
-            self.weights -= self.learning_rate * dw
-            self.bias -= self.learning_rate * db
+        theta = self._solve(features, y.reshape(-1, 1))
+        self.weights = theta[:-1, 0]
+        self.bias = float(theta[-1, 0])
+
+    def _fit_multinomial(self, features, codes, n_classes):
+        """softmax 多分类训练：所有类别共享一次前向计算，每次求损失和梯度只需两次矩阵乘法"""
+        n_samples = features.shape[0]
+        targets = np.zeros((n_samples, n_classes), dtype=np.float64)
+        targets[np.arange(n_samples), codes] = 1.0
+
+        theta = self._solve(features, targets)
+        self.weights = theta[:-1]
+        self.bias = theta[-1]
     
     def _fit_ovr(self, features, labels, classes):
         """One-vs-Rest多分类训练"""
@@ -90,7 +224,9 @@ class LogisticRegression:
                 learning_rate=self.learning_rate,
                 n_iterations=self.n_iterations,
                 regularization=self.regularization,
-                lambda_param=self.lambda_param
+                lambda_param=self.lambda_param,
+                solver=self.solver,
+                tol=self.tol
             )
             
             # 构建二分类问题
@@ -99,54 +235,34 @@ class LogisticRegression:
             # 训练
             clf.fit(features, binary_labels)
             self.classifiers.append(clf)
+        self.n_iter_ = max(clf.n_iter_ for clf in self.classifiers)
     
     def _predict_proba_np(self, features):
         """内部预测概率（numpy版本）"""
         z = np.dot(features, self.weights) + self.bias
+        if self.weights.ndim == 2:
+            return self._softmax(z)
         return self._sigmoid(z)
     
     def predict(self, features, threshold=0.5):
         """预测多个样本的类别"""
-        features = np.array(features, dtype=np.float64)
-        
-        if self.classifiers is not None:  # 多分类
-            probabilities = []
-            for clf in self.classifiers:
-                prob = clf.predict_proba(features)
-                probabilities.append(prob)
-            
-            probabilities = np.array(probabilities).T
-            class_indices = np.argmax(probabilities, axis=1)
-            
-            # 映射回原始类别
-            inverse_mapping = {i: cls for cls, i in self.class_mapping.items()}
-            return [inverse_mapping[idx] for idx in class_indices]
-        else:  # 二分类
-            if self.weights is None or self.bias is None:
-                raise ValueError("逻辑回归模型尚未训练，请先调用fit或train方法")
-            
-            y_pred_proba = self.predict_proba(features)
-            inverse_mapping = {v: k for k, v in self.class_mapping.items()}
-            return [inverse_mapping[1] if p >= threshold else inverse_mapping[0] 
-                    for p in y_pred_proba]
+        if self.classes_ is not None and len(self.classes_) == 2:
+            return self.classes_[(self.predict_proba(features) >= threshold).astype(np.int64)]
+        return self.classes_[np.argmax(self.predict_proba(features), axis=1)]
     
     def predict_proba(self, features):
-        """预测多个样本属于各类别的概率"""
+        """
+        预测多个样本属于各类别的概率
+        二分类时返回正类概率，形状 (n_samples,)；多分类时返回形状 (n_samples, n_classes) 的数组
+        （一对多策略下每列是对应二分类器的输出，各行之和不一定为 1）
+        """
         features = np.array(features, dtype=np.float64)
         
-        if self.classifiers is not None:  # 多分类
-            probabilities = []
-            for clf in self.classifiers:
-                prob = clf.predict_proba(features)
-                probabilities.append(prob)
-            
-            probabilities = np.array(probabilities).T
-            return probabilities.tolist()
-        else:  # 二分类
-            if self.weights is None or self.bias is None:
-                raise ValueError("逻辑回归模型尚未训练，请先调用fit或train方法")
-                
-            return self._predict_proba_np(features).tolist()
+        if self.classifiers is not None:  # 一对多
+            return np.column_stack([clf.predict_proba(features) for clf in self.classifiers])
+        if self.weights is None or self.bias is None:
+            raise ValueError("逻辑回归模型尚未训练，请先调用fit或train方法")
+        return self._predict_proba_np(features)
     
     def train(self, features, labels):
         """适配后端接口的训练方法"""
@@ -159,15 +275,24 @@ class LogisticRegression:
             # 每个分类器的权重
             coefficients = [clf.weights.tolist() if hasattr(clf, 'weights') and clf.weights is not None else [] 
                            for clf in self.classifiers]
-        elif self.weights is not None:  # 二分类
-            coefficients = self.weights.tolist()
+        elif self.weights is not None:  # 二分类或 softmax 多分类（每个类别一列权重）
+            coefficients = self.weights.T.tolist() if self.weights.ndim == 2 else self.weights.tolist()
+
+        if self.bias is None:
+            intercept = 0.0
+        elif np.ndim(self.bias) == 0:
+            intercept = float(self.bias)
+        else:
+            intercept = self.bias.tolist()
         
         return {
             'type': 'logistic_regression',
             'coefficients': coefficients,
-            'intercept': float(self.bias) if self.bias is not None else 0.0,
+            'intercept': intercept,
             'learning_rate': float(self.learning_rate),
             'n_iterations': int(self.n_iterations),
+            'solver': self.solver,
+            'n_iter': int(self.n_iter_),
             'regularization': self.regularization or 'none',
             'multi_class': self.multi_class
         }
\ No newline at end of file
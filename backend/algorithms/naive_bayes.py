@@ -1,101 +1,274 @@
-import math
-from collections import defaultdict
 from backend.utils import one_hot_encode
 import numpy as np
 
 class NaiveBayes:
-    """朴素贝叶斯算法实现（适用于分类问题）"""
-    def __init__(self, laplace_smoothing=1e-9):
+    """朴素贝叶斯算法实现（适用于分类问题）
+
+    distribution='discrete' 时把每个特征按分箱边界离散化后统计频率；
+    distribution='gaussian' 时假设每个类别下的特征服从正态分布，只保存均值和方差数组。
+    """
+    # 计算高斯对数似然时每块临时数组的元素个数上限，控制内存
+    BLOCK_ELEMENTS = 1 << 22
+
+    def __init__(self, laplace_smoothing=1e-9, distribution='discrete', var_smoothing=1e-9, max_bins=64):
+        """
+        :param laplace_smoothing: 拉普拉斯平滑参数
+        :param distribution: 条件概率模型：'discrete'（离散化计数）或 'gaussian'（高斯分布）
+        :param var_smoothing: 高斯模型中加到各方差上的最大特征方差的比例，避免方差为 0
+        :param max_bins: 离散模型中每个特征的最大箱数；取值个数不超过它的特征每个取值单独一箱
+        """
+        if distribution not in ('discrete', 'gaussian'):
+            raise ValueError(f"不支持的条件概率模型: {distribution}")
         self.laplace_smoothing = laplace_smoothing  # 拉普拉斯平滑参数
+        self.distribution = distribution
+        self.var_smoothing = var_smoothing
+        self.max_bins = max_bins
         self.class_priors = {}                      # 类先验概率 P(y)
-        self.feature_probs = defaultdict(dict)      # 特征条件概率 P(x_i|y)
         self.classes = None                         # 所有类别
         self.num_features = None                    # 特征数量
-    
+        self.class_log_prior_ = None                # 类先验概率的对数，形状 (n_classes,)
+        # 离散模型参数
+        self.bin_edges_ = None                      # 每个特征的分箱边界（列表，长度各不相同）
+        self.feature_count_ = None                  # (类别, 特征, 箱) 的样本数，增量训练的充分统计量
+        self.feature_log_prob_ = None               # 对数条件概率 log P(箱|类别)，形状 (n_classes, n_features, max_bins)
+        # 高斯模型参数（行与 classes 顺序一致）
+        self.theta_ = None                          # 各类别下特征的均值，形状 (n_classes, n_features)
+        self.var_ = None                            # 各类别下特征的方差（已加 epsilon_），形状 (n_classes, n_features)
+        self.epsilon_ = 0.0                         # 加到方差上的平滑项
+        self._sq_dev_ = None                        # 各类别下特征的离差平方和，增量训练的充分统计量
+        self.class_count_ = None                    # 各类别的样本数
+
+    def _encode_labels(self, labels, classes=None):
+        """把标签编码为 self.classes 中的下标，遇到新类别时先扩充各统计量"""
+        labels = np.asarray(labels)
+        new_classes = np.unique(labels) if classes is None else np.unique(np.asarray(classes))
+        if classes is not None and not np.isin(labels, new_classes).all():
+            raise ValueError("标签中出现了 classes 参数之外的类别")
+        self._expand_classes(new_classes)
+        return np.searchsorted(np.asarray(self.classes), labels)
+
+    def _expand_classes(self, new_classes):
+        """把类别集合扩充为并集（保持有序），统计量中新类别的位置补 0"""
+        old_classes = np.asarray(self.classes if self.classes is not None else [], dtype=np.asarray(new_classes).dtype)
+        merged = np.union1d(old_classes, new_classes)
+        if self.classes is not None and len(merged) == len(old_classes):
+            return
+        self.classes = merged.tolist()
+        if self.class_count_ is None:
+            return
+        positions = np.searchsorted(merged, old_classes)
+
+        def expand(array):
+            expanded = np.zeros((len(merged),) + array.shape[1:])
+            expanded[positions] = array
+            return expanded
+
+        self.class_count_ = expand(self.class_count_)
+        if self.distribution == 'gaussian':
+            self.theta_ = expand(self.theta_)
+            self._sq_dev_ = expand(self._sq_dev_)
+        else:
+            self.feature_count_ = expand(self.feature_count_)
+
+    def _update_gaussian(self, X, codes):
+        """用一批样本更新每个类别的样本数、均值和离差平方和（Chan 等人的并行合并公式）"""
+        num_classes = len(self.classes)
+        one_hot = np.zeros((len(X), num_classes))
+        one_hot[np.arange(len(X)), codes] = 1.0
+        counts = one_hot.sum(axis=0)
+        means = (one_hot.T @ X) / np.maximum(counts, 1)[:, None]
+        sq_dev = one_hot.T @ (X - means[codes]) ** 2
+        self._merge_gaussian_stats(counts, means, sq_dev)
+
+    def _merge_gaussian_stats(self, counts, means, sq_dev):
+        if self.class_count_ is None:
+            self.class_count_, self.theta_, self._sq_dev_ = counts, means, sq_dev
+            return
+        total = self.class_count_ + counts
+        safe_total = np.maximum(total, 1)[:, None]
+        delta = means - self.theta_
+        self._sq_dev_ = self._sq_dev_ + sq_dev + \
+            delta ** 2 * (self.class_count_ * counts)[:, None] / safe_total
+        self.theta_ = self.theta_ + delta * counts[:, None] / safe_total
+        self.class_count_ = total
+
+    def _update_discrete(self, X, codes):
+        """用一批样本累加 (类别, 特征, 箱) 计数：一次 bincount 得到稠密的计数张量"""
+        num_classes = len(self.classes)
+        bins = self._digitize(X)
+        flat = ((codes[:, None] * self.num_features + np.arange(self.num_features)) * self.max_bins + bins).ravel()
+        counts = np.bincount(flat, minlength=num_classes * self.num_features * self.max_bins)
+        counts = counts.reshape(num_classes, self.num_features, self.max_bins).astype(np.float64)
+        class_counts = np.bincount(codes, minlength=num_classes).astype(np.float64)
+        if self.class_count_ is None:
+            self.class_count_, self.feature_count_ = class_counts, counts
+        else:
+            self.class_count_ = self.class_count_ + class_counts
+            self.feature_count_ = self.feature_count_ + counts
+
+    def _update_parameters(self):
+        """由充分统计量计算模型参数（先验、均值方差或对数条件概率）"""
+        num_classes = len(self.classes)
+        num_samples = self.class_count_.sum()
+
+        if self.distribution == 'gaussian':
+            self.var_ = self._sq_dev_ / np.maximum(self.class_count_, 1)[:, None]
+            # 全体样本的方差 = 类内离差 + 类间离差，由各类别的统计量直接得到，不需要原始数据
+            overall_mean = self.class_count_ @ self.theta_ / num_samples
+            overall_var = (self._sq_dev_.sum(axis=0) +
+                           self.class_count_ @ (self.theta_ - overall_mean) ** 2) / num_samples
+            self.epsilon_ = self.var_smoothing * overall_var.max()
+            self.var_ += self.epsilon_
+        else:
+            # 计算每个箱的条件概率（带拉普拉斯平滑），特征 j 的有效箱数为 len(bin_edges_[j]) + 1
+            n_bins = np.array([len(edges) + 1 for edges in self.bin_edges_], dtype=np.float64)
+            self.feature_log_prob_ = np.log(self.feature_count_ + self.laplace_smoothing) - \
+                np.log(self.class_count_[:, None, None] + self.laplace_smoothing * n_bins[None, :, None])
+
+        # 计算类先验概率 P(y)
+        priors = (self.class_count_ + self.laplace_smoothing) / (num_samples + self.laplace_smoothing * num_classes)
+        self.class_log_prior_ = np.log(priors)
+        self.class_priors = {cls: float(prior) for cls, prior in zip(self.classes, priors)}
+
+    def _reset(self):
+        self.classes = None
+        self.num_features = None
+        self.class_count_ = None
+        self.theta_ = self.var_ = self._sq_dev_ = None
+        self.bin_edges_ = self.feature_count_ = self.feature_log_prob_ = None
+
+    def _joint_log_likelihood(self, X):
+        """所有样本在所有类别下的联合对数似然，形状 (n_samples, n_classes)
+
+        直接计算 Σ_j (x_j - μ_j)²/σ_j²，而不是展开成矩阵乘法：展开式在特征均值远大于其标准差时
+        会严重相消而丢失精度。按行分块计算，每块的 (行, 类别, 特征) 临时数组不超过 BLOCK_ELEMENTS 个元素。
+        """
+        precision = 1.0 / self.var_
+        log_norm = -0.5 * np.sum(np.log(2.0 * np.pi * self.var_), axis=1)
+        quadratic = np.empty((X.shape[0], len(self.classes)))
+        block = max(1, self.BLOCK_ELEMENTS // max(1, self.var_.size))
+        for start in range(0, X.shape[0], block):
+            diff = X[start:start + block, None, :] - self.theta_
+            quadratic[start:start + block] = np.sum(diff ** 2 * precision, axis=2)
+        return self.class_log_prior_ + log_norm - 0.5 * quadratic
+
     def train(self, features, labels):
         """训练朴素贝叶斯模型"""
         if len(features) == 0:
             raise ValueError("训练数据不能为空")
         if len(features) != len(labels):
             raise ValueError("特征和标签数量必须相同")
-        
-        self.num_features = len(features[0])
-        self.classes = list(set(labels))
-        num_samples = len(features)
-        
-        # 计算类先验概率 P(y)
-        class_counts = defaultdict(int)
-        for label in labels:
-            class_counts[label] += 1
-        
-        for cls in self.classes:
-            self.class_priors[cls] = (class_counts[cls] + self.laplace_smoothing) / \
-                                    (num_samples + self.laplace_smoothing * len(self.classes))
-        
-        # 计算每个特征的条件概率 P(x_i|y)
-        # 首先按类别分组特征
-        class_features = defaultdict(list)
-        for feature, label in zip(features, labels):
-            class_features[label].append(feature)
-        
-        # 对每个类别和每个特征计算条件概率
-        for cls in self.classes:
-            features_for_cls = class_features[cls]
-            num_samples_cls = len(features_for_cls)
-            
-            for feature_idx in range(self.num_features):
-                # 收集该类别下该特征的所有值
-                feature_values = [f[feature_idx] for f in features_for_cls]
-                
-                # 计算每个可能值的概率（假设特征是离散的）
-                value_counts = defaultdict(int)
-                for value in feature_values:
-                    # 为了处理连续值，我们将其离散化
-                    # 这里简单地四舍五入到小数点后两位
-                    rounded_value = round(value, 2)
-                    value_counts[rounded_value] += 1
-                
-                # 计算每个值的条件概率（带拉普拉斯平滑）
-                total_values = len(value_counts)
-                for value, count in value_counts.items():
-                    prob = (count + self.laplace_smoothing) / \
-                          (num_samples_cls + self.laplace_smoothing * (total_values + 1))
-                    self.feature_probs[(cls, feature_idx)][value] = prob
-    
-    def _predict_sample(self, sample):
-        """预测单个样本"""
-        # 计算每个类别的后验概率（对数形式，避免下溢）
-        log_probs = {}
-        
-        for cls in self.classes:
-            # 先验概率的对数
-            log_prob = math.log(self.class_priors[cls])
-            
-            # 加上每个特征的条件概率的对数
-            for feature_idx in range(self.num_features):
-                value = round(sample[feature_idx], 2)
-                
-                # 如果该值在训练集中没有出现过，使用平滑后的概率
-                if value not in self.feature_probs[(cls, feature_idx)]:
-                    total_values = len(self.feature_probs[(cls, feature_idx)])
-                    prob = self.laplace_smoothing / \
-                          (sum(self.feature_probs[(cls, feature_idx)].values()) * len(self.classes) + 
-                           self.laplace_smoothing * (total_values + 1))
-                    log_prob += math.log(prob)
-                else:
-                    log_prob += math.log(self.feature_probs[(cls, feature_idx)][value])
-            
-            log_probs[cls] = log_prob
-        
-        # 返回后验概率最大的类别
-        return max(log_probs, key=log_probs.get)
+
+        self._reset()
+        X = np.asarray(features, dtype=np.float64)
+        if self.distribution == 'discrete':
+            self._fit_bin_edges(X)
+        self.partial_fit(X, labels)
+
+    def partial_fit(self, features, labels, classes=None):
+        """
+        用一批数据增量训练，可以逐块读入数据而不必一次性载入全部训练集
+        :param features: 这一批的特征数据
+        :param labels: 这一批的标签
+        :param classes: 全部类别；可在第一次调用时给出，使尚未出现的类别也参与先验计算
+        离散模型的分箱边界在第一次调用时由该批数据确定，之后保持不变。
+        """
+        X = np.asarray(features, dtype=np.float64)
+        if X.ndim != 2 or len(X) == 0:
+            raise ValueError("训练数据不能为空")
+        if len(X) != len(labels):
+            raise ValueError("特征和标签数量必须相同")
+        if self.num_features is not None and X.shape[1] != self.num_features:
+            raise ValueError("特征数量与之前的训练数据不一致")
+        self.num_features = X.shape[1]
+        if self.distribution == 'discrete' and self.bin_edges_ is None:
+            self._fit_bin_edges(X)
+
+        codes = self._encode_labels(labels, classes)
+        if self.distribution == 'gaussian':
+            self._update_gaussian(X, codes)
+        else:
+            self._update_discrete(X, codes)
+        self._update_parameters()
+        return self
+
+    def merge(self, other):
+        """
+        合并另一个在其它数据分片上训练的模型的统计量，结果与在全部数据上训练相同
+        :param other: 同类型、同参数的 NaiveBayes 模型（离散模型还要求分箱边界相同）
+        """
+        if other.class_count_ is None:
+            return self
+        if other.distribution != self.distribution:
+            raise ValueError("只能合并相同条件概率模型的朴素贝叶斯模型")
+        if self.class_count_ is None:
+            self.num_features = other.num_features
+            if self.distribution == 'discrete':
+                self.bin_edges_ = [edges.copy() for edges in other.bin_edges_]
+        elif other.num_features != self.num_features:
+            raise ValueError("特征数量不一致，无法合并")
+        elif self.distribution == 'discrete' and not all(
+                np.array_equal(a, b) for a, b in zip(self.bin_edges_, other.bin_edges_)):
+            raise ValueError("分箱边界不一致，无法合并离散模型")
+
+        self._expand_classes(np.asarray(other.classes))
+        positions = np.searchsorted(np.asarray(self.classes), np.asarray(other.classes))
+        counts = np.zeros(len(self.classes))
+        counts[positions] = other.class_count_
+        if self.distribution == 'gaussian':
+            means = np.zeros((len(self.classes), self.num_features))
+            sq_dev = np.zeros_like(means)
+            means[positions], sq_dev[positions] = other.theta_, other._sq_dev_
+            self._merge_gaussian_stats(counts, means, sq_dev)
+        else:
+            feature_count = np.zeros((len(self.classes), self.num_features, self.max_bins))
+            feature_count[positions] = other.feature_count_
+            if self.class_count_ is None:
+                self.class_count_, self.feature_count_ = counts, feature_count
+            else:
+                self.class_count_ = self.class_count_ + counts
+                self.feature_count_ = self.feature_count_ + feature_count
+        self._update_parameters()
+        return self
+
+    def _fit_bin_edges(self, X):
+        """为每个特征确定分箱边界：取值不多时相邻取值的中点作边界（每个取值一箱），否则按分位数分箱"""
+        self.bin_edges_ = []
+        for feature_idx in range(X.shape[1]):
+            unique_values = np.unique(X[:, feature_idx])
+            if len(unique_values) <= self.max_bins:
+                edges = (unique_values[1:] + unique_values[:-1]) / 2
+            else:
+                quantiles = np.linspace(0, 1, self.max_bins + 1)[1:-1]
+                edges = np.unique(np.quantile(X[:, feature_idx], quantiles))
+            self.bin_edges_.append(edges)
+
+    def _digitize(self, X):
+        """把特征矩阵转换为箱编号矩阵，形状 (n_samples, n_features)"""
+        bins = np.empty(X.shape, dtype=np.int64)
+        for feature_idx, edges in enumerate(self.bin_edges_):
+            bins[:, feature_idx] = np.digitize(X[:, feature_idx], edges)
+        return bins
+
+    def _discrete_log_likelihood(self, X):
+        """逐特征按箱编号取出对数概率并累加，形状 (n_samples, n_classes)"""
+        bins = self._digitize(X)
+        jll = np.tile(self.class_log_prior_, (len(X), 1))
+        for feature_idx in range(self.num_features):
+            jll += self.feature_log_prob_[:, feature_idx, bins[:, feature_idx]].T
+        return jll
     
     def predict(self, features):
         """预测多个样本"""
         if self.classes is None:
             raise RuntimeError("朴素贝叶斯模型尚未训练，请先调用train方法")
-        
-        return [self._predict_sample(sample) for sample in features]
+
+        X = np.asarray(features, dtype=np.float64)
+        if self.distribution == 'gaussian':
+            jll = self._joint_log_likelihood(X)
+        else:
+            jll = self._discrete_log_likelihood(X)
+        return np.asarray(self.classes)[np.argmax(jll, axis=1)]
     
     def get_visualization_data(self):
         """获取朴素贝叶斯可视化数据"""
@@ -108,25 +281,33 @@ class NaiveBayes:
         
         visualization_data = {
             'class_priors': class_priors,
+            'distribution': self.distribution,
             'feature_probs_sample': {}
         }
+
+        if self.distribution == 'gaussian':
+            # 每个类别取前2个特征的均值和方差
+            for cls_idx, cls in enumerate(self.classes[:2]):
+                cls_key = int(cls) if isinstance(cls, np.integer) else cls
+                for feature_idx in range(min(2, self.num_features)):
+                    visualization_data['feature_probs_sample'][f"({cls_key}, {feature_idx})"] = {
+                        'mean': float(self.theta_[cls_idx, feature_idx]),
+                        'var': float(self.var_[cls_idx, feature_idx])
+                    }
+            return visualization_data
         
-        # 每个类别取前2个特征的概率分布
-        for cls in self.classes[:2]:
+        # 每个类别取前2个特征的前5个箱的概率分布，键为箱的区间
+        for cls_idx, cls in enumerate(self.classes[:2]):
             # 确保类别是Python类型
             cls_key = int(cls) if isinstance(cls, np.integer) else cls
             
             for feature_idx in range(min(2, self.num_features)):
-                # 确保特征索引是Python类型
-                idx_key = int(feature_idx) if isinstance(feature_idx, np.integer) else feature_idx
-                
-                if (cls, feature_idx) in self.feature_probs:
-                    # 转换特征值为Python类型
-                    probs = [(int(k) if isinstance(k, np.integer) else k, v) 
-                            for k, v in self.feature_probs[(cls, feature_idx)].items()]
-                    
-                    # 将元组键转换为字符串，例如 "(0, 1)"
-                    tuple_key = f"({cls_key}, {idx_key})"
-                    visualization_data['feature_probs_sample'][tuple_key] = dict(probs[:5])
+                edges = np.concatenate(([-np.inf], self.bin_edges_[feature_idx], [np.inf]))
+                probs = np.exp(self.feature_log_prob_[cls_idx, feature_idx, :len(edges) - 1])
+                # 将元组键转换为字符串，例如 "(0, 1)"
+                tuple_key = f"({cls_key}, {feature_idx})"
+                visualization_data['feature_probs_sample'][tuple_key] = {
+                    f"[{edges[b]:.4g}, {edges[b + 1]:.4g})": float(probs[b]) for b in range(min(5, len(probs)))
+                }
         
         return visualization_data
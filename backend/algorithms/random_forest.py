@@ -1,30 +1,123 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np
-import random
+from backend.utils import count_votes, resolve_n_workers
 from .decision_tree import DecisionTree
 
+# 工作进程中指向共享内存训练数据的只读视图（由 _attach_shared_data 在进程启动时设置一次）
+_shared_X = None
+_shared_y = None
+_shared_blocks = []
+
+
+def _attach_shared_data(x_spec, y_spec):
+    """工作进程初始化：按名字挂载共享内存，构造零拷贝的 ndarray 视图"""
+    global _shared_X, _shared_y
+    arrays = []
+    for name, shape, dtype in (x_spec, y_spec):
+        block = shared_memory.SharedMemory(name=name)
+        _shared_blocks.append(block)  # 保持引用，避免缓冲区被提前释放
+        arrays.append(np.ndarray(shape, dtype=dtype, buffer=block.buf))
+    _shared_X, _shared_y = arrays
+
+
+def _fit_tree_from_shared(args):
+    seed, params = args
+    return _fit_tree(_shared_X, _shared_y, seed, params)
+
+
+def _fit_tree(X, y, seed, params):
+    """用独立的随机种子训练一棵树，返回 (树, 使用的特征索引, 袋内样本掩码)
+
+    特征子集和 bootstrap 样本都只由该树自己的种子决定，因此结果与工作进程数量无关。
+    """
+    rng = np.random.default_rng(seed)
+    n_samples, n_features = X.shape
+
+    # 随机选择特征
+    feature_indices = rng.choice(n_features, params['n_features'], replace=False)
+
+    # 生成bootstrap样本，只使用选中的特征
+    sample_indices = rng.integers(0, n_samples, n_samples)
+    X_sample_subset = X[np.ix_(sample_indices, feature_indices)]
+
+    tree = DecisionTree(
+        max_depth=params['max_depth'],
+        min_samples_split=params['min_samples_split'],
+        max_bins=params['max_bins']
+    )
+    tree.train(X_sample_subset, y[sample_indices])
+    in_bag = np.zeros(n_samples, dtype=bool)
+    in_bag[sample_indices] = True
+    # 将numpy数组索引转换为Python列表，避免JSON序列化问题
+    return tree, [int(idx) for idx in feature_indices], in_bag
+
+
 class RandomForest:
     """随机森林算法实现（分类）"""
-    def __init__(self, n_trees=10, max_depth=10, min_samples_split=2, n_features=None):
+    def __init__(self, n_trees=10, max_depth=10, min_samples_split=2, n_features=None, max_bins=None,
+                 n_jobs=None, random_state=None, warm_start=False):
         """
         初始化随机森林模型
         :param n_trees: 树的数量
         :param max_depth: 树的最大深度
         :param min_samples_split: 最小分裂样本数
         :param n_features: 每次分裂考虑的特征数量
+        :param max_bins: 决策树特征预分箱的最大箱数，None 表示精确搜索
+        :param n_jobs: 并行训练的进程数，None 或 1 表示串行，-1 表示使用全部CPU核
+        :param random_state: 随机种子，每棵树由它派生出独立的种子，结果与进程数无关
+        :param warm_start: 为 True 时再次调用 train 会保留已有的树，只训练新增到 n_trees 的部分（训练数据必须不变）
         """
         self.n_trees = n_trees
         self.max_depth = max_depth
         self.min_samples_split = min_samples_split
         self.n_features = n_features  # 每棵树使用的特征数量
+        self.max_bins = max_bins
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.warm_start = warm_start
+        self.classes_ = None          # 训练集中的类别（有序），树在类别编号上训练
         self.trees = []
         self.feature_indices_ = None  # 存储每棵树使用的特征索引
+        self._packed = None           # 所有树拼接后的节点数组，推理时使用
+        self.in_bag_ = None           # 袋内样本掩码，形状 (n_trees, n_samples)
+        self.oob_score_ = None        # 袋外（OOB）准确率
+        self.oob_coverage_ = None     # 至少被一棵树留在袋外的样本比例
+        self.feature_importances_ = None  # 基于OOB的置换特征重要性（准确率下降量）
+        self._seed_sequence = None    # 树种子的来源，继续派生即可得到后续树的种子
+        self._X_train = None          # 训练数据引用，增量加树和OOB计算时使用
+        self._y_train_codes = None
+        self._permutation_seed = None     # 置换重要性的种子，每个特征的固定排列由它和特征编号重新生成
+        self._oob_counts = None           # 所有树的袋外投票计数，形状 (n_samples, n_classes)
+        self._permuted_oob_counts = None  # 置换各特征后的袋外投票计数，形状 (n_features, n_samples, n_classes)
         
-    def _bootstrap_sample(self, X, y):
-        """生成bootstrap样本"""
-        n_samples = X.shape[0]
-        indices = np.random.choice(n_samples, n_samples, replace=True)
-        return X[indices], y[indices]
-    
+    def _fit_trees(self, X, y, seeds):
+        """训练一组树；多进程时训练数据放入共享内存，各进程零拷贝读取，任务只传递种子"""
+        params = {
+            'n_features': self.n_features,
+            'max_depth': self.max_depth,
+            'min_samples_split': self.min_samples_split,
+            'max_bins': self.max_bins
+        }
+        n_workers = min(resolve_n_workers(self.n_jobs), len(seeds))
+        if n_workers <= 1:
+            return [_fit_tree(X, y, seed, params) for seed in seeds]
+
+        blocks = []
+        try:
+            specs = []
+            for array in (X, y):
+                block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+                blocks.append(block)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+                specs.append((block.name, array.shape, array.dtype))
+            with ProcessPoolExecutor(n_workers, initializer=_attach_shared_data, initargs=tuple(specs)) as pool:
+                return list(pool.map(_fit_tree_from_shared, [(seed, params) for seed in seeds]))
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
     # 确保train方法正确实现
     def train(self, X, y):
         """
@@ -32,67 +125,182 @@ class RandomForest:
         :param X: 特征数据
         :param y: 标签数据
         """
-        if not isinstance(X, np.ndarray):
-            X = np.array(X)
-        if not isinstance(y, np.ndarray):
-            y = np.array(y)
-            
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        y = np.asarray(y).ravel()
+
         n_features = X.shape[1]
-        
+
         # 确定每棵树使用的特征数量
         if self.n_features is None:
             self.n_features = int(np.sqrt(n_features))  # 分类问题默认使用sqrt(n_features)
         else:
             self.n_features = min(self.n_features, n_features)
-        
+
+        if self.warm_start and self.trees:
+            # 热启动：沿用已有的树和类别编码，只补齐缺少的树。
+            # 已有树的袋内掩码对应之前的训练样本，只有训练数据不变时OOB估计才成立
+            if X.shape[1] != self._X_train.shape[1]:
+                raise ValueError("热启动时特征数量必须与之前的训练数据一致")
+            if not (np.array_equal(X, self._X_train) and np.array_equal(y, self.classes_[self._y_train_codes])):
+                raise ValueError("热启动时训练数据必须与之前的训练数据相同")
+            n_new = self.n_trees - len(self.trees)
+            if n_new < 0:
+                raise ValueError(f"热启动时 n_trees ({self.n_trees}) 不能小于已有树的数量 ({len(self.trees)})")
+            if n_new > 0:
+                self._grow(n_new)
+            return
+
+        # 标签统一编码为类别编号，便于共享内存传输
+        self.classes_, y_codes = np.unique(y, return_inverse=True)
+        # 保存副本：调用方之后原地修改 X 不应影响热启动时的数据一致性检查和OOB计算
+        self._X_train, self._y_train_codes = X.copy(), y_codes.astype(np.int64)
+
+        # 每棵树的种子由同一个种子序列派生，后续加树时继续派生，保证结果可复现
+        self._seed_sequence = np.random.SeedSequence(self.random_state)
         self.trees = []
-        self.feature_indices_ = []  # 记录每棵树使用的特征
-        
-        for _ in range(self.n_trees):
-            # 随机选择特征
-            feature_indices = np.random.choice(n_features, self.n_features, replace=False)
-            # 将numpy数组索引转换为Python列表，避免JSON序列化问题
-            self.feature_indices_.append([int(idx) for idx in feature_indices])
-            
-            # 创建决策树
-            tree = DecisionTree(
-                max_depth=self.max_depth,
-                min_samples_split=self.min_samples_split
-            )
-            
-            # 生成bootstrap样本
-            X_sample, y_sample = self._bootstrap_sample(X, y)
-            
-            # 只使用选中的特征
-            X_sample_subset = X_sample[:, feature_indices]
-            
-            # 训练决策树（确保DecisionTree类有train方法）
-            tree.train(X_sample_subset, y_sample)
-            
-            # 添加到森林
-            self.trees.append(tree)
-    
+        self.feature_indices_ = []
+        self.in_bag_ = np.zeros((0, X.shape[0]), dtype=bool)
+        # OOB缓存：已有树在原始/置换数据上的袋外投票计数。票数不超过树的数量，用 int32 存储
+        self._permutation_seed = int(np.random.default_rng(self.random_state).integers(2 ** 63))
+        self._oob_counts = np.zeros((X.shape[0], len(self.classes_)), dtype=np.int32)
+        self._permuted_oob_counts = np.zeros((n_features,) + self._oob_counts.shape, dtype=np.int32)
+        self._grow(self.n_trees)
+
+    def add_trees(self, n):
+        """
+        在已训练的森林上增量训练 n 棵新树，已有的树保持不变
+        :param n: 新增树的数量
+        """
+        if not self.trees:
+            raise RuntimeError("模型尚未训练，请先调用train方法")
+        if n < 1:
+            raise ValueError("新增树的数量必须为正整数")
+        self._grow(n)
+
+    def _grow(self, n):
+        """训练 n 棵新树并追加到森林中，然后重新打包节点数组、更新OOB估计"""
+        X, y_codes = self._X_train, self._y_train_codes
+        results = self._fit_trees(X, y_codes, self._seed_sequence.spawn(n))
+        new_tree_ids = np.arange(len(self.trees), len(self.trees) + n)
+        self.trees.extend(tree for tree, _, _ in results)
+        self.feature_indices_.extend(feature_indices for _, feature_indices, _ in results)  # 记录每棵树使用的特征
+        self.in_bag_ = np.vstack([self.in_bag_] + [in_bag[None, :] for _, _, in_bag in results])
+        self.n_trees = len(self.trees)
+        self._pack_trees()
+        self._compute_oob(X, y_codes, new_tree_ids)
+
+    def _oob_accuracy(self, counts, y_codes):
+        """根据袋外投票计数返回 (OOB准确率, 有袋外预测的样本掩码)"""
+        covered = counts.sum(axis=1) > 0
+        if not covered.any():
+            return None, covered
+        correct = np.argmax(counts[covered], axis=1) == y_codes[covered]
+        return float(correct.mean()), covered
+
+    def _compute_oob(self, X, y_codes, tree_ids):
+        """把新增的树的袋外投票累加到缓存的计数中，再更新OOB准确率和置换特征重要性
+
+        每个特征的置换在首次训练时固定下来，已有树在置换数据上的袋外投票也已计入缓存，
+        因此加树时只需对新树推理；置换某个特征又只会影响用到该特征的树，只对这些树重新推理。
+        """
+        n_classes = len(self.classes_)
+        tree_ids = np.asarray(tree_ids)
+        oob = ~self.in_bag_[tree_ids].T
+        votes = self._packed['value'][self._apply(X, tree_ids)]
+        counts = count_votes(votes, n_classes, oob)
+        self._oob_counts += counts
+
+        X_permuted = X.copy()
+        for feature in range(X.shape[1]):
+            uses_feature = [i for i, t in enumerate(tree_ids) if feature in self.feature_indices_[t]]
+            if not uses_feature:
+                self._permuted_oob_counts[feature] += counts
+                continue
+            permutation = np.random.default_rng([self._permutation_seed, feature]).permutation(X.shape[0])
+            X_permuted[:, feature] = X[permutation, feature]
+            permuted_votes = votes.copy()
+            permuted_votes[:, uses_feature] = self._packed['value'][self._apply(X_permuted, tree_ids[uses_feature])]
+            self._permuted_oob_counts[feature] += count_votes(permuted_votes, n_classes, oob)
+            X_permuted[:, feature] = X[:, feature]
+
+        self.oob_score_, covered = self._oob_accuracy(self._oob_counts, y_codes)
+        self.oob_coverage_ = float(covered.mean())
+        if self.oob_score_ is None:
+            self.feature_importances_ = None
+            return
+        self.feature_importances_ = np.array([
+            self.oob_score_ - self._oob_accuracy(permuted_counts, y_codes)[0]
+            for permuted_counts in self._permuted_oob_counts
+        ])
+
+    def _pack_trees(self):
+        """把所有树的扁平节点数组拼接成一个整体，供批量推理时所有树同步下移
+
+        - 特征索引换算为原始特征空间中的全局索引
+        - 子节点编号加上各树的偏移量；叶节点的左右子节点指向自身、阈值为 inf，
+          这样已到达叶节点的样本在后续层中原地不动，无需额外判断
+        - 叶节点的值换算为森林级别的类别编号
+        """
+        sizes = [len(tree.feature_) for tree in self.trees]
+        offsets = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+        feature, threshold, left, right, value = [], [], [], [], []
+        for tree, indices, offset in zip(self.trees, self.feature_indices_, offsets):
+            node_ids = np.arange(len(tree.feature_), dtype=np.int64) + offset
+            leaf = tree.feature_ < 0
+            feature.append(np.where(leaf, 0, np.asarray(indices, dtype=np.int64)[np.maximum(tree.feature_, 0)]))
+            threshold.append(np.where(leaf, np.inf, tree.threshold_))
+            left.append(np.where(leaf, node_ids, tree.left_ + offset))
+            right.append(np.where(leaf, node_ids, tree.right_ + offset))
+            value.append(np.where(leaf, tree.classes_[np.maximum(tree.value_, 0)], -1))
+        self._packed = {
+            'roots': offsets,
+            'feature': np.concatenate(feature),
+            'threshold': np.concatenate(threshold),
+            'left': np.concatenate(left),
+            'right': np.concatenate(right),
+            'value': np.concatenate(value),
+            'depth': max(tree.depth_ for tree in self.trees)
+        }
+
+    def _apply(self, X, tree_ids=None):
+        """返回形状 (n_samples, n_trees) 的叶节点编号（打包后的全局编号），tree_ids 可只取部分树"""
+        packed = self._packed
+        roots = packed['roots'] if tree_ids is None else packed['roots'][tree_ids]
+        node = np.tile(roots, (X.shape[0], 1))
+        rows = np.arange(X.shape[0])[:, None]
+        for _ in range(packed['depth']):
+            go_left = X[rows, packed['feature'][node]] < packed['threshold'][node]
+            node = np.where(go_left, packed['left'][node], packed['right'][node])
+        return node
+
+    def _vote_counts(self, X):
+        """统计每个样本在各类别上获得的票数，形状 (n_samples, n_classes)"""
+        if not self.trees:
+            raise RuntimeError("模型尚未训练，请先调用train方法")
+        if self._packed is None:
+            self._pack_trees()
+
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return count_votes(self._packed['value'][self._apply(X)], len(self.classes_))
+
+    def predict_proba(self, X):
+        """
+        预测每个类别的概率（各树投票比例）
+        :param X: 样本数据
+        :return: 形状 (n_samples, n_classes) 的概率矩阵，列顺序与 classes_ 一致
+        """
+        return self._vote_counts(X) / len(self.trees)
+
     def predict(self, X):
         """
         预测样本类别
         :param X: 样本数据
         :return: 预测结果
         """
-        if not self.trees:
-            raise RuntimeError("模型尚未训练，请先调用train方法")
-            
-        X = np.array(X)
-        # 收集所有树的预测结果
-        tree_preds = np.array([
-            tree.predict(X[:, indices]) 
-            for tree, indices in zip(self.trees, self.feature_indices_)
-        ])
-        
-        # 对预测结果进行多数投票
-        tree_preds = np.swapaxes(tree_preds, 0, 1)
-        y_pred = [self._most_common_label(preds) for preds in tree_preds]
-        
-        return np.array(y_pred)
+        # 多数投票，平票时取编号最小的类别
+        return self.classes_[np.argmax(self._vote_counts(X), axis=1)]
     
     def evaluate(self, X, y):
         """评估模型性能"""
@@ -107,12 +315,6 @@ class RandomForest:
             'accuracy': float(accuracy)  # 确保转换为Python类型
         }
         
-    def _most_common_label(self, y):
-        """返回最常见的标签"""
-        unique, counts = np.unique(y, return_counts=True)
-        # 确保返回Python原生类型而非numpy类型
-        return int(unique[np.argmax(counts)]) if isinstance(unique[0], np.integer) else unique[np.argmax(counts)]
-        
     def get_visualization_data(self):
         """获取随机森林可视化数据，确保所有数据可JSON序列化"""
         if not self.trees:
@@ -145,5 +347,11 @@ class RandomForest:
             'n_trees': self.n_trees,
             'sample_trees': tree_data,
             'max_depth': self.max_depth,
-            'n_features': self.n_features
+            'n_features': self.n_features,
+            'oob_score': self.oob_score_,
+            'oob_coverage': self.oob_coverage_,
+            'feature_importances': (
+                [float(v) for v in self.feature_importances_]
+                if self.feature_importances_ is not None else None
+            )
         }
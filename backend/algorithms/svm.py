@@ -1,114 +1,570 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+from backend.utils import count_votes, resolve_n_workers
+
+
+class Kernel:
+    """批量核函数计算
+
+    核矩阵由一次矩阵乘法 X1·X2ᵀ 得到，RBF 核再借助预先算好的平方范数
+    ||a||² + ||b||² - 2a·b 得到距离；所有逐元素运算都原地进行。
+    dot 按内存上限把 X1 切成行块，每块的核矩阵用完即释放。
+    """
+    SUPPORTED = ('linear', 'rbf', 'poly', 'sigmoid')
+
+    def __init__(self, name='rbf', gamma=0.5, degree=3, coef0=0.0, memory_limit_mb=64):
+        """
+        :param name: 核函数名称：'linear'、'rbf'、'poly' 或 'sigmoid'
+        :param gamma: RBF / 多项式 / sigmoid 核的系数
+        :param degree: 多项式核的次数
+        :param coef0: 多项式 / sigmoid 核的常数项
+        :param memory_limit_mb: 分块计算时单个核矩阵块的内存上限（MB）
+        """
+        if name not in self.SUPPORTED:
+            raise ValueError(f"不支持的核函数: {name}，目前支持 {', '.join(self.SUPPORTED)}")
+        self.name = name
+        self.gamma = gamma
+        self.degree = degree
+        self.coef0 = coef0
+        self.memory_limit_mb = memory_limit_mb
+
+    @staticmethod
+    def squared_norms(X):
+        return np.einsum('ij,ij->i', X, X)
+
+    def matrix(self, X1, X2, X1_sq_norms=None, X2_sq_norms=None):
+        """核矩阵 K[i, j] = k(X1[i], X2[j])"""
+        K = X1 @ X2.T
+        if self.name == 'linear':
+            return K
+        if self.name == 'rbf':
+            if X1_sq_norms is None:
+                X1_sq_norms = self.squared_norms(X1)
+            if X2_sq_norms is None:
+                X2_sq_norms = self.squared_norms(X2)
+            K *= -2.0
+            K += X1_sq_norms[:, None]
+            K += X2_sq_norms[None, :]
+            np.maximum(K, 0.0, out=K)
+            K *= -self.gamma
+            return np.exp(K, out=K)
+        K *= self.gamma
+        K += self.coef0
+        if self.name == 'poly':
+            return np.power(K, self.degree, out=K)
+        return np.tanh(K, out=K)
+
+    def diag(self, X):
+        """核矩阵对角线 k(x_i, x_i)"""
+        if self.name == 'rbf':
+            return np.ones(len(X))
+        values = self.squared_norms(X)
+        if self.name == 'linear':
+            return values
+        values = self.gamma * values + self.coef0
+        return values ** self.degree if self.name == 'poly' else np.tanh(values)
+
+    def block_rows(self, n_columns):
+        """在内存上限内一个核矩阵块最多能有多少行"""
+        return max(1, int(self.memory_limit_mb * (1 << 20)) // (8 * max(1, n_columns)))
+
+    def dot(self, X1, X2, coef, X2_sq_norms=None):
+        """分块计算 K(X1, X2) @ coef，不会一次性生成完整的核矩阵"""
+        if self.name == 'rbf' and X2_sq_norms is None:
+            X2_sq_norms = self.squared_norms(X2)
+        out = np.empty((len(X1),) + coef.shape[1:])
+        step = self.block_rows(len(X2))
+        for start in range(0, len(X1), step):
+            out[start:start + step] = self.matrix(X1[start:start + step], X2, None, X2_sq_norms) @ coef
+        return out
+
+
+class _KernelRowCache:
+    """按 LRU 策略缓存核矩阵的整行，总大小不超过 cache_size_mb
+
+    SMO 每次迭代只需要两行核矩阵，而同一批样本会被反复选中，缓存命中后就不必重新计算。
+    多分类时各个二分类子问题（在线程池中并发训练）共享同一个缓存，行以全局样本编号为键。
+    """
+    def __init__(self, X, kernel, cache_size_mb):
+        self._X = X
+        self._kernel = kernel
+        self._sq_norms = kernel.squared_norms(X)
+        self.capacity = max(2, int(cache_size_mb * (1 << 20)) // (8 * max(1, len(X))))
+        self._rows = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def row(self, i):
+        """返回第 i 个样本与全部样本的核函数值"""
+        with self._lock:
+            values = self._rows.get(i)
+            if values is not None:
+                self._rows.move_to_end(i)
+                self.hits += 1
+                return values
+            self.misses += 1
+        # 计算放在锁外，多个线程可以同时计算不同的行
+        values = self._kernel.matrix(self._X[i:i + 1], self._X, self._sq_norms[i:i + 1], self._sq_norms)[0]
+        with self._lock:
+            self._rows[i] = values
+            self._rows.move_to_end(i)
+            if len(self._rows) > self.capacity:
+                self._rows.popitem(last=False)  # 淘汰最久未使用的行
+        return values
+
 
 class SVM:
-    """支持向量机算法实现（二分类）"""
-    def __init__(self, learning_rate=0.001, lambda_param=0.01, n_iters=1000, kernel='linear', gamma=0.5):
+    """支持向量机算法实现（二分类；多分类时分解为一对多或一对一的二分类子问题）"""
+    def __init__(self, learning_rate=0.001, lambda_param=0.01, n_iters=1000, kernel='linear', gamma=0.5,
+                 batch_size=64, lr_schedule='pegasos', tol=1e-4, random_state=None,
+                 C=1.0, cache_size_mb=200, shrinking=True, approximation=None, n_components=100,
+                 multi_class='ovr', n_jobs=None, degree=3, coef0=0.0, memory_limit_mb=64):
         """
         初始化SVM模型
-        :param learning_rate: 学习率
+        :param learning_rate: 学习率（lr_schedule 为 'constant' 或 'invscaling' 时使用）
         :param lambda_param: 正则化参数
-        :param n_iters: 迭代次数
-        :param kernel: 核函数 ('linear' 或 'rbf')
-        :param gamma: RBF核参数
+        :param n_iters: 最大迭代轮数（遍历训练集的次数）
+        :param kernel: 核函数 ('linear'、'rbf'、'poly' 或 'sigmoid')
+        :param gamma: RBF / 多项式 / sigmoid 核参数
+        :param batch_size: 线性核小批量次梯度法每批的样本数
+        :param lr_schedule: 学习率策略：'pegasos'（1/(2λt)）、'invscaling'（learning_rate/√t）或 'constant'
+        :param tol: 相邻两轮目标函数的相对变化小于 tol 时停止（线性核）；
+                    SMO 中为 KKT 条件的最大违反量（非线性核）
+        :param random_state: 随机种子，控制样本打乱顺序
+        :param C: 非线性核对偶问题的惩罚系数
+        :param cache_size_mb: SMO 核矩阵行缓存的大小上限（MB）
+        :param shrinking: SMO 是否启用收缩（暂时移出不太可能再变化的变量）
+        :param approximation: 核近似方法，None 表示精确求解；'rff' 表示用随机傅里叶特征近似 RBF 核，
+                              再用线性求解器训练
+        :param n_components: 随机傅里叶特征的维数 D
+        :param multi_class: 多分类策略：'ovr'（一对多）或 'ovo'（一对一）
+        :param n_jobs: 并发训练二分类子问题的线程数，None 或 1 表示串行，-1 表示使用全部CPU核
+        :param degree: 多项式核的次数
+        :param coef0: 多项式 / sigmoid 核的常数项
+        :param memory_limit_mb: 预测时分块计算核矩阵的内存上限（MB）
         """
+        if kernel not in Kernel.SUPPORTED:
+            raise ValueError(f"不支持的核函数: {kernel}，目前支持 {', '.join(Kernel.SUPPORTED)}")
+        if multi_class not in ('ovr', 'ovo'):
+            raise ValueError(f"不支持的多分类策略: {multi_class}")
+        if approximation not in (None, 'rff'):
+            raise ValueError(f"不支持的核近似方法: {approximation}")
+        if approximation == 'rff' and kernel != 'rbf':
+            raise ValueError("随机傅里叶特征只能用于近似 RBF 核")
+        if lr_schedule not in ('pegasos', 'invscaling', 'constant'):
+            raise ValueError(f"不支持的学习率策略: {lr_schedule}")
         self.learning_rate = learning_rate
         self.lambda_param = lambda_param
         self.n_iters = n_iters
         self.kernel = kernel
         self.gamma = gamma
+        self.batch_size = batch_size
+        self.lr_schedule = lr_schedule
+        self.tol = tol
+        self.random_state = random_state
+        self.C = C
+        self.cache_size_mb = cache_size_mb
+        self.shrinking = shrinking
+        self.approximation = approximation
+        self.n_components = n_components
+        self.multi_class = multi_class
+        self.n_jobs = n_jobs
+        self.degree = degree
+        self.coef0 = coef0
+        self.memory_limit_mb = memory_limit_mb
+        self.kernel_ = None         # 训练时按当前参数创建的 Kernel 对象
+        self._sv_sq_norms = None    # 支持向量的平方范数，预测时复用
+        self.classes_ = None
+        self.coef_ = None           # 各子问题的权重，形状 (n_problems, n_features)（线性核 / RFF）
+        self.intercept_ = None      # 各子问题的偏置（决策函数为 f(x) - intercept）
+        self.pairs_ = None          # 一对一时各子问题的 (正类, 负类) 编号
+        self.rff_weights_ = None    # 随机傅里叶特征的投影矩阵，形状 (n_features, n_components)
+        self.rff_offsets_ = None    # 随机傅里叶特征的相位，形状 (n_components,)
         self.w = None
         self.b = None
         self.support_vectors = None
+        self.dual_coef_ = None      # 支持向量的 α_i·y_i，形状 (n_problems, n_support_vectors)（非线性核）
+        self.cache_hit_rate_ = None # SMO 核矩阵行缓存的命中率
+        self.n_iter_ = 0            # 实际迭代轮数
+        self.objective_ = None      # 最终的目标函数值
+
+    def _rff_transform(self, X):
+        """随机傅里叶特征 z(x) = √(2/D)·cos(xW + φ)，满足 E[z(x)·z(y)] = exp(-γ||x-y||²)"""
+        return np.sqrt(2.0 / self.n_components) * np.cos(X @ self.rff_weights_ + self.rff_offsets_)
+
+    def _objective(self, X, Y, W, b):
+        """原始问题目标函数：λ||w||² + 平均合页损失；Y 的每一列是一个子问题，返回每列的目标函数值"""
+        hinge = np.maximum(0.0, 1.0 - Y * (X @ W - b))
+        return self.lambda_param * np.sum(W ** 2, axis=0) + hinge.mean(axis=0)
 
-    def _kernel_function(self, X1, X2):
-        """核函数实现"""
-        if self.kernel == 'linear':
-            return np.dot(X1, X2)
-        elif self.kernel == 'rbf':
-            diff = X1 - X2
-            return np.exp(-self.gamma * np.dot(diff, diff))
+    def _step_size(self, t):
+        if self.lr_schedule == 'pegasos':
+            return 1.0 / (2.0 * self.lambda_param * t)
+        if self.lr_schedule == 'invscaling':
+            return self.learning_rate / np.sqrt(t)
+        return self.learning_rate
+
+    def _fit_linear(self, X, y, rng):
+        """小批量次梯度法（Pegasos）求解线性SVM，返回 (w, b, 迭代轮数, 目标函数值)
+
+        每个小批量只做一次矩阵乘法找出违反间隔的样本，再一次性累加它们的梯度；
+        每轮结束时计算完整目标函数，相对变化小于 tol 时提前停止。
+        y 为二维 (n_samples, n_problems) 时，共享同一组样本的多个子问题（一对多）在同一个循环里
+        一起训练，每个小批量只需一次 (B, d) × (d, n_problems) 的矩阵乘法。
+        """
+        n_samples, n_features = X.shape
+        Y = y.reshape(n_samples, -1).astype(np.float64)
+        batch_size = max(1, min(self.batch_size, n_samples))
+        # 在中心化的特征上求解：w·x - b = w·(x-μ) - (b - w·μ)，偏置不参与正则化，因此目标函数不变，
+        # 但偏置不再与特征的均值耦合，次梯度法收敛快得多
+        mean = X.mean(axis=0)
+        X = X - mean
+        W = np.zeros((n_features, Y.shape[1]))
+        b = np.zeros(Y.shape[1])
+        # Pegasos 的最优解满足 ||w|| <= 1/√(2λ)，每步投影回该球内以稳定早期的大步长
+        radius = 1.0 / np.sqrt(2.0 * self.lambda_param) if self.lambda_param > 0 else np.inf
+        t = 0
+        objective = self._objective(X, Y, W, b)
+        n_iter = 0
+        for n_iter in range(1, self.n_iters + 1):
+            order = rng.permutation(n_samples)
+            for start in range(0, n_samples, batch_size):
+                batch = order[start:start + batch_size]
+                X_batch, Y_batch = X[batch], Y[batch]
+                t += 1
+                eta = self._step_size(t)
+                # 违反间隔的样本贡献 -y·x，其余样本梯度为 0
+                violated = np.where(Y_batch * (X_batch @ W - b) < 1, Y_batch, 0.0)
+                W_grad = 2 * self.lambda_param * W - (X_batch.T @ violated) / len(batch)
+                b_grad = violated.sum(axis=0) / len(batch)
+                W -= eta * W_grad
+                b -= eta * b_grad
+                norms = np.sqrt(np.sum(W ** 2, axis=0))
+                W *= np.minimum(1.0, radius / np.maximum(norms, 1e-300))
+
+            # 多个子问题时以目标函数之和（即整个分解问题的目标函数）判断收敛
+            previous, objective = objective, self._objective(X, Y, W, b)
+            if abs(previous.sum() - objective.sum()) <= self.tol * max(1.0, abs(previous.sum())):
+                break
+        b = b + mean @ W
+        if y.ndim == 1:
+            return W[:, 0], float(b[0]), n_iter, float(objective[0])
+        return W, b, n_iter, objective
+
+    def _subproblems(self, codes):
+        """二分类子问题列表 [(样本编号或 None, ±1 标签)]；None 表示使用全部样本"""
+        n_classes = len(self.classes_)
+        if n_classes == 2:
+            self.pairs_ = None
+            return [(None, np.where(codes == 1, 1, -1))]
+        if self.multi_class == 'ovr':
+            self.pairs_ = None
+            return [(None, np.where(codes == k, 1, -1)) for k in range(n_classes)]
+        self.pairs_ = [(a, b) for a in range(n_classes) for b in range(a + 1, n_classes)]
+        problems = []
+        for a, b in self.pairs_:
+            index = np.where((codes == a) | (codes == b))[0]
+            problems.append((index, np.where(codes[index] == a, 1, -1)))
+        return problems
+
+    def _fit_subproblem(self, features, cache, index, y_, seed):
+        """训练一个二分类子问题，返回 (支持向量的全局编号, 系数, 偏置, 迭代次数, 目标函数值)
+
+        线性核 / RFF 返回的系数为权重向量，非线性核返回支持向量的 α_i·y_i。
+        """
+        if index is None:
+            index = np.arange(len(features))
+            subset = features
         else:
-            raise ValueError("不支持的核函数，目前仅支持 'linear' 或 'rbf'")
+            subset = features[index]
+        if cache is not None:
+            alpha, rho, n_iter = self._fit_smo(subset, y_, cache, index)
+            support = np.where(alpha > 0)[0]
+            return index[support], alpha[support] * y_[support], rho, n_iter, None
+        w, b, n_iter, objective = self._fit_linear(subset, y_, np.random.default_rng(seed))
+        # 识别支持向量（位于间隔边界上或间隔内的点）
+        margins = y_ * (subset @ w - b)
+        support = np.where((margins <= 1.001) if margins.ndim == 1 else np.any(margins <= 1.001, axis=1))[0]
+        return index[support], w, b, n_iter, objective
 
     def train(self, X, y):
         """
         训练SVM模型
         :param X: 特征数据
-        :param y: 标签数据（应为0和1或-1和1）
+        :param y: 标签数据（两个类别时为二分类，更多类别时按 multi_class 分解）
         """
-        X = np.array(X)
+        X = np.array(X, dtype=np.float64)
         y = np.array(y)
-
-        # 确保标签是-1和1
-        y_ = np.where(y <= 0, -1, 1)
         n_samples, n_features = X.shape
 
+        self.classes_, codes = np.unique(y, return_inverse=True)
+        if len(self.classes_) < 2:
+            raise ValueError("训练数据至少需要包含两个类别")
+
         # ✅ 加入随机扰动让每次训练略有不同
-        rng = np.random.default_rng()
+        rng = np.random.default_rng(self.random_state)
         shuffle_idx = rng.permutation(n_samples)
         X = X[shuffle_idx]
-        y_ = y_[shuffle_idx]
-
-        # 初始化权重和偏置
-        self.w = np.zeros(n_features)
-        self.b = 0
-
-        # 梯度下降优化
-        for _ in range(self.n_iters):
-            for idx, x_i in enumerate(X):
-                # 对RBF核的支持
-                if self.kernel == 'rbf':
-                    kernel_sum = np.sum([self._kernel_function(x_i, X[j]) * y_[j] for j in range(n_samples)])
-                    condition_value = kernel_sum - self.b
-                else:
-                    condition_value = np.dot(x_i, self.w) - self.b
-
-                condition = y_[idx] * condition_value >= 1
-                if condition:
-                    self.w -= self.learning_rate * (2 * self.lambda_param * self.w)
-                else:
-                    self.w -= self.learning_rate * (2 * self.lambda_param * self.w - np.dot(x_i, y_[idx]))
-                    self.b -= self.learning_rate * y_[idx]
-
-        # ✅ 识别支持向量（距离边界最近的点）
-        support_vector_indices = []
-        for idx, x_i in enumerate(X):
-            if y_[idx] * (np.dot(x_i, self.w) - self.b) <= 1.001:
-                support_vector_indices.append(idx)
+        codes = codes[shuffle_idx]
 
+        self.kernel_ = Kernel(self.kernel, self.gamma, self.degree, self.coef0, self.memory_limit_mb)
+
+        # 所有子问题共享同一份输入：线性核为 X，RFF 为变换后的特征，非线性核共享一个核矩阵行缓存
+        cache = None
+        if self.approximation == 'rff':
+            # W 的每个元素服从 N(0, 2γ)，φ 服从 U(0, 2π)；只由 random_state 决定，与样本顺序无关
+            feature_rng = np.random.default_rng(self.random_state)
+            self.rff_weights_ = feature_rng.normal(0.0, np.sqrt(2 * self.gamma), (n_features, self.n_components))
+            self.rff_offsets_ = feature_rng.uniform(0.0, 2 * np.pi, self.n_components)
+            features = self._rff_transform(X)
+        elif self.kernel == 'linear':
+            features = X
+        else:
+            # 非线性核：SMO 求解对偶问题，只保留支持向量的对偶系数
+            features = X
+            cache = _KernelRowCache(X, self.kernel_, self.cache_size_mb)
+
+        problems = self._subproblems(codes)
+        if cache is None and self.pairs_ is None and len(problems) > 1:
+            # 线性核 / RFF 的一对多：所有子问题共享全部样本，合并为一次多列求解
+            problems = [(None, np.column_stack([y_ for _, y_ in problems]))]
+        seeds = rng.spawn(len(problems))
+        n_workers = min(resolve_n_workers(self.n_jobs), len(problems))
+        tasks = [(features, cache, index, y_, seed) for (index, y_), seed in zip(problems, seeds)]
+        if n_workers <= 1:
+            results = [self._fit_subproblem(*task) for task in tasks]
+        else:
+            with ThreadPoolExecutor(n_workers) as pool:
+                results = list(pool.map(lambda task: self._fit_subproblem(*task), tasks))
+
+        self.intercept_ = np.concatenate([np.atleast_1d(result[2]) for result in results])
+        self.n_iter_ = max(result[3] for result in results)
+        support_vector_indices = np.unique(np.concatenate([result[0] for result in results]))
+        if cache is None:
+            # 每个结果的权重为向量（单个子问题）或 (n_features, n_problems) 矩阵（合并求解的一对多）
+            self.coef_ = np.vstack([np.reshape(result[1], (len(result[1]), -1)).T for result in results])
+            self.dual_coef_ = None
+            self.objective_ = float(sum(np.sum(result[4]) for result in results))
+            self.cache_hit_rate_ = None
+        else:
+            # 各子问题的支持向量合并为一个集合，对偶系数矩阵中不属于该子问题的位置为 0
+            self.coef_ = None
+            self.dual_coef_ = np.zeros((len(results), len(support_vector_indices)))
+            for row, (support, coef, _, _, _) in zip(self.dual_coef_, results):
+                row[np.searchsorted(support_vector_indices, support)] = coef
+            self.objective_ = None
+            lookups = cache.hits + cache.misses
+            self.cache_hit_rate_ = cache.hits / lookups if lookups else 0.0
+
+        # 二分类时保持原来的单个权重向量 / 偏置
+        binary = len(self.intercept_) == 1
+        self.w = (self.coef_[0] if binary else self.coef_) if self.coef_ is not None else None
+        self.b = self.intercept_[0] if binary else self.intercept_
         self.support_vectors = {
             'X': X[support_vector_indices],
-            'y': y_[support_vector_indices]
+            'y': (np.where(codes[support_vector_indices] == 1, 1, -1) if binary
+                  else self.classes_[codes[support_vector_indices]])
         }
+        self._sv_sq_norms = Kernel.squared_norms(self.support_vectors['X'])
 
-    def predict(self, X):
-        """预测样本类别"""
-        if self.w is None:
-            raise RuntimeError("模型尚未训练，请先调用 train() 方法")
-        X = np.array(X)
-
-        if self.kernel == 'rbf':
-            y_pred = []
-            for x in X:
-                kernel_sum = np.sum([self._kernel_function(x, sv) for sv in self.support_vectors['X']])
-                y_pred.append(kernel_sum - self.b)
-            y_pred = np.array(y_pred)
+    @staticmethod
+    def _select_working_set(active, alpha, y, G, C, row, diag):
+        """二阶信息的工作集选择（WSS2）
+
+        i 取违反 KKT 条件最严重的变量，j 取使目标函数下降量 b²/a 最大的变量。
+        返回 (i, j, 最大违反量)，找不到可更新的变量对时 i 或 j 为 -1。
+        """
+        y_a, alpha_a = y[active], alpha[active]
+        yG = y_a * G[active]
+        up = ((y_a > 0) & (alpha_a < C)) | ((y_a < 0) & (alpha_a > 0))
+        low = ((y_a < 0) & (alpha_a < C)) | ((y_a > 0) & (alpha_a > 0))
+        if not up.any() or not low.any():
+            return -1, -1, 0.0
+        minus_yG = np.where(up, -yG, -np.inf)
+        ii = int(np.argmax(minus_yG))
+        Gmax = minus_yG[ii]
+        Gmax2 = np.max(np.where(low, yG, -np.inf))
+        i = active[ii]
+
+        K_i = row(i)[active]
+        grad_diff = Gmax + yG
+        quad = np.maximum(diag[i] + diag[active] - 2 * K_i, 1e-12)
+        candidates = low & (grad_diff > 0)
+        if not candidates.any():
+            return i, -1, Gmax + Gmax2
+        jj = int(np.argmin(np.where(candidates, -grad_diff ** 2 / quad, np.inf)))
+        return i, active[jj], Gmax + Gmax2
+
+    def _shrink(self, active, alpha, y, G, C):
+        """收缩：去掉位于边界且在当前最大违反量下不会再被选中的变量"""
+        y_a, alpha_a, G_a = y[active], alpha[active], G[active]
+        yG = y_a * G_a
+        up = ((y_a > 0) & (alpha_a < C)) | ((y_a < 0) & (alpha_a > 0))
+        low = ((y_a < 0) & (alpha_a < C)) | ((y_a > 0) & (alpha_a > 0))
+        Gmax1 = np.max(np.where(up, -yG, -np.inf))
+        Gmax2 = np.max(np.where(low, yG, -np.inf))
+        at_upper = alpha_a >= C
+        at_lower = alpha_a <= 0
+        shrunk = (at_upper & (y_a > 0) & (-G_a > Gmax1)) | (at_upper & (y_a < 0) & (-G_a > Gmax2)) | \
+                 (at_lower & (y_a > 0) & (G_a > Gmax2)) | (at_lower & (y_a < 0) & (G_a > Gmax1))
+        return active[~shrunk], Gmax1 + Gmax2
+
+    def _reconstruct_gradient(self, X, y, alpha, G, inactive):
+        """重新计算被收缩变量的梯度：G_t = Σ_j α_j y_j y_t K(x_t, x_j) - 1"""
+        if len(inactive) == 0:
+            return
+        sv = np.where(alpha > 0)[0]
+        G[inactive] = -1.0
+        if len(sv):
+            G[inactive] += y[inactive] * self.kernel_.dot(X[inactive], X[sv], alpha[sv] * y[sv])
+
+    def _fit_smo(self, X, y, cache, index):
+        """SMO 求解对偶问题 min ½αᵀQα - eᵀα，0 ≤ α ≤ C，yᵀα = 0，其中 Q_ij = y_i y_j K_ij
+
+        X 为子问题的样本，index 为它们在缓存中的全局编号。
+        返回 (α, ρ, 迭代次数)，决策函数为 Σ α_i y_i K(x_i, x) - ρ。
+        """
+        full = len(index) == len(cache._X)
+
+        def row(i):
+            values = cache.row(index[i])
+            return values if full else values[index]
+
+        n_samples = len(y)
+        C, eps = self.C, self.tol
+        y = y.astype(np.float64)
+        diag = self.kernel_.diag(X)
+        alpha = np.zeros(n_samples)
+        G = -np.ones(n_samples)      # 梯度 Qα - e
+        active = np.arange(n_samples)
+        unshrunk = False
+        shrink_interval = min(n_samples, 1000)
+        counter = shrink_interval
+        max_iter = max(self.n_iters * n_samples, 1)
+
+        n_iter = 0
+        while n_iter < max_iter:
+            counter -= 1
+            if self.shrinking and counter == 0:
+                counter = shrink_interval
+                active, gap = self._shrink(active, alpha, y, G, C)
+                if not unshrunk and gap <= 10 * eps:
+                    # 接近收敛时恢复全部变量一次，避免过早收缩导致的错误
+                    unshrunk = True
+                    self._reconstruct_gradient(X, y, alpha, G, np.setdiff1d(np.arange(n_samples), active))
+                    active = np.arange(n_samples)
+
+            i, j, gap = self._select_working_set(active, alpha, y, G, C, row, diag)
+            if i < 0 or j < 0 or gap < eps:
+                if len(active) == n_samples:
+                    break
+                # 在收缩后的子问题上收敛了：恢复全部变量，在完整问题上再检查一次
+                self._reconstruct_gradient(X, y, alpha, G, np.setdiff1d(np.arange(n_samples), active))
+                active = np.arange(n_samples)
+                counter = 1
+                i, j, gap = self._select_working_set(active, alpha, y, G, C, row, diag)
+                if i < 0 or j < 0 or gap < eps:
+                    break
+            n_iter += 1
+
+            # 解析求解两个变量的子问题，并裁剪到可行域
+            K_i, K_j = row(i), row(j)
+            old_alpha_i, old_alpha_j = alpha[i], alpha[j]
+            quad = max(diag[i] + diag[j] - 2 * K_i[j], 1e-12)
+            if y[i] != y[j]:
+                delta = (-G[i] - G[j]) / quad
+                diff = alpha[i] - alpha[j]
+                alpha[i] += delta
+                alpha[j] += delta
+                if diff > 0:
+                    if alpha[j] < 0:
+                        alpha[j], alpha[i] = 0.0, diff
+                elif alpha[i] < 0:
+                    alpha[i], alpha[j] = 0.0, -diff
+                if diff > 0:
+                    if alpha[i] > C:
+                        alpha[i], alpha[j] = C, C - diff
+                elif alpha[j] > C:
+                    alpha[j], alpha[i] = C, C + diff
+            else:
+                delta = (G[i] - G[j]) / quad
+                total = alpha[i] + alpha[j]
+                alpha[i] -= delta
+                alpha[j] += delta
+                if total > C:
+                    if alpha[i] > C:
+                        alpha[i], alpha[j] = C, total - C
+                elif alpha[j] < 0:
+                    alpha[j], alpha[i] = 0.0, total
+                if total > C:
+                    if alpha[j] > C:
+                        alpha[j], alpha[i] = C, total - C
+                elif alpha[i] < 0:
+                    alpha[i], alpha[j] = 0.0, total
+
+            # 只更新活动变量的梯度
+            delta_i, delta_j = alpha[i] - old_alpha_i, alpha[j] - old_alpha_j
+            y_a = y[active]
+            G[active] += y_a * (y[i] * delta_i * K_i[active] + y[j] * delta_j * K_j[active])
+
+        # 偏置 ρ：自由支持向量上 y_t G_t 的平均值；没有自由支持向量时取可行区间的中点
+        yG = y * G
+        free = (alpha > 0) & (alpha < C)
+        if free.any():
+            rho = float(yG[free].mean())
         else:
-            y_pred = np.dot(X, self.w) - self.b
+            at_upper, at_lower = alpha >= C, alpha <= 0
+            ub_mask = (at_upper & (y < 0)) | (at_lower & (y > 0))
+            lb_mask = (at_upper & (y > 0)) | (at_lower & (y < 0))
+            ub = yG[ub_mask].min() if ub_mask.any() else np.inf
+            lb = yG[lb_mask].max() if lb_mask.any() else -np.inf
+            rho = float((ub + lb) / 2) if np.isfinite(ub + lb) else 0.0
+        return alpha, rho, n_iter
 
-        return np.where(y_pred >= 0, 1, 0)
+    def decision_function(self, X):
+        """所有子问题的决策值，形状 (n_samples, n_problems)，一次矩阵乘法得到"""
+        if self.intercept_ is None:
+            raise RuntimeError("模型尚未训练，请先调用 train() 方法")
+        X = np.array(X, dtype=np.float64)
+        if self.approximation == 'rff':
+            return self._rff_transform(X) @ self.coef_.T - self.intercept_
+        if self.kernel != 'linear':
+            return self.kernel_.dot(X, self.support_vectors['X'], self.dual_coef_.T, self._sv_sq_norms) - self.intercept_
+        return X @ self.coef_.T - self.intercept_
+
+    def predict(self, X):
+        """预测样本类别"""
+        scores = self.decision_function(X)
+        if self.pairs_ is None and scores.shape[1] == 1:
+            return self.classes_[(scores[:, 0] >= 0).astype(np.int64)]
+        if self.pairs_ is None:
+            return self.classes_[np.argmax(scores, axis=1)]
+        # 一对一：每个子问题给胜者投一票，平票取编号小的类别
+        pairs = np.array(self.pairs_)
+        winners = np.where(scores >= 0, pairs[:, 0], pairs[:, 1])
+        votes = count_votes(winners, len(self.classes_))
+        return self.classes_[np.argmax(votes, axis=1)]
 
     def get_visualization_data(self):
         """获取SVM可视化数据"""
-        if self.w is None:
+        if self.b is None:
             return None
 
         return {
-            'weights': self.w.tolist(),
-            'bias': float(self.b),
+            'weights': self.w.tolist() if self.w is not None else None,
+            'bias': np.asarray(self.b).tolist(),
             'support_vectors': {
                 'X': self.support_vectors['X'].tolist(),
                 'y': self.support_vectors['y'].tolist()
             },
-            'kernel': self.kernel
+            'kernel': self.kernel,
+            'approximation': self.approximation,
+            'multi_class': self.multi_class if len(self.classes_) > 2 else None,
+            'classes': self.classes_.tolist(),
+            'n_iter': self.n_iter_,
+            'n_support_vectors': int(len(self.support_vectors['y'])),
+            'cache_hit_rate': self.cache_hit_rate_
         }
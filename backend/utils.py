@@ -1,4 +1,5 @@
 import math
+import os
 import random
 from collections import defaultdict
 import numpy as np
@@ -191,6 +192,26 @@ def majority_vote(labels):
     counts = np.bincount(labels)
     return np.argmax(counts)
 
+def count_votes(votes, n_classes, mask=None):
+    """
+    按行统计票数
+    :param votes: 类别编号矩阵，形状 (n_rows, n_voters)
+    :param n_classes: 类别数量
+    :param mask: 可选的布尔矩阵，与 votes 形状相同，只统计为 True 的票
+    :return: 每行在各类别上的票数，形状 (n_rows, n_classes)
+    """
+    n_rows = votes.shape[0]
+    # 二维 bincount：把 (行, 类别) 展平成一维编号后一次计数
+    flat = np.arange(n_rows)[:, None] * n_classes + votes
+    flat = flat.ravel() if mask is None else flat[mask]
+    return np.bincount(flat, minlength=n_rows * n_classes).reshape(n_rows, n_classes)
+
+def resolve_n_workers(n_jobs):
+    """把 n_jobs 参数换算为工作线程/进程数：None 或 1 表示串行，-1 表示使用全部CPU核"""
+    if n_jobs == -1:
+        return os.cpu_count() or 1
+    return max(1, int(n_jobs or 1))
+
 def entropy(labels):
     """计算熵"""
     if not labels:
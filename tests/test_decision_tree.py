@@ -0,0 +1,23 @@
+import numpy as np
+from sklearn.datasets import load_iris
+
+from backend.algorithms.decision_tree import DecisionTree
+from backend.algorithms.random_forest import RandomForest
+
+
+def test_binned_node_without_valid_split_becomes_leaf():
+    # 标签冲突的重复样本：节点不纯但没有可分的边界
+    tree = DecisionTree(max_bins=4)
+    tree.train([[0], [0]], [0, 1])
+    assert len(tree.predict([[0]])) == 1
+
+    tree = DecisionTree(max_bins=4)
+    tree.train([[1], [1], [2]], [0, 1, 1])
+    assert list(tree.predict([[2]])) == [1]
+
+
+def test_binned_random_forest_on_iris():
+    X, y = load_iris(return_X_y=True)
+    forest = RandomForest(n_trees=10, random_state=0, max_bins=16)
+    forest.train(X, y)
+    assert np.mean(forest.predict(X) == y) > 0.9